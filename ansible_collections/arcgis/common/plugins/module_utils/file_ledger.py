@@ -0,0 +1,117 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Ledger of verified files in local software repository directories.
+#
+# The ledger records size, modification time, and inode of each verified file together with
+# its SHA-256 hash and the ETag of the source object. A file is considered verified while its
+# size, modification time, and inode match the ledger entry, so unchanged files are not re-hashed.
+#
+# {
+#   "files": {
+#     "/opt/software/archives/ArcGIS_Server_Linux_114_192977.tar.gz": {
+#       "size": 1369225012,
+#       "mtime_ns": 1736937600000000000,
+#       "inode": 1048602,
+#       "sha256": "1b766ecdf0b16635f195ebd25151c4e2e7755197c743ae8d25790a07cb4e9b61",
+#       "etag": "\"5d41402abc4b2a76b9719d911017c592-164\""
+#     }
+#   }
+# }
+
+import json
+import os
+import threading
+
+LEDGER_FILENAME = '.repository-ledger.json'
+
+
+class FileLedger:
+
+    def __init__(self, directory: str, filename=LEDGER_FILENAME):
+        self.path = os.path.join(directory, filename)
+        self.files = {}
+        self._changed = False
+        self._lock = threading.Lock()
+
+    # Loads the ledger. If the ledger does not exist or cannot be read, the ledger is empty.
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self.files = json.load(f).get('files', {})
+        except (OSError, ValueError):
+            self.files = {}
+
+        return self
+
+    @staticmethod
+    def _stat(filepath: str):
+        stat = os.stat(filepath)
+        return {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'inode': stat.st_ino
+        }
+
+    # Returns True if the file was verified against the SHA-256 hash or ETag and did not change since.
+    def is_verified(self, filepath: str, sha256=None, etag=None):
+        if not sha256 and not etag:
+            return False
+
+        with self._lock:
+            entry = self.files.get(os.path.abspath(filepath))
+
+        if entry is None:
+            return False
+
+        try:
+            stat = self._stat(filepath)
+        except OSError:
+            return False
+
+        if any(entry.get(key) != value for key, value in stat.items()):
+            return False
+
+        return (sha256 is not None and entry.get('sha256') == sha256) or \
+               (etag is not None and entry.get('etag') == etag)
+
+    # Records the verified file's SHA-256 hash and source object ETag.
+    def record(self, filepath: str, sha256=None, etag=None):
+        entry = self._stat(filepath)
+        entry['sha256'] = sha256
+        entry['etag'] = etag
+
+        with self._lock:
+            self.files[os.path.abspath(filepath)] = entry
+            self._changed = True
+
+    def remove(self, filepath: str):
+        with self._lock:
+            if self.files.pop(os.path.abspath(filepath), None) is not None:
+                self._changed = True
+
+    # Saves the ledger if it was changed. The ledger is replaced atomically.
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+
+            tmp_path = self.path + '.tmp'
+
+            with open(tmp_path, 'w') as f:
+                json.dump({'files': self.files}, f, indent=1, sort_keys=True)
+
+            os.replace(tmp_path, self.path)
+
+            self._changed = False
@@ -0,0 +1,112 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Helper functions for streaming SHA-256 hash validation of repository files.
+# The files are hashed in fixed-size chunks, so memory usage does not depend on the file size.
+
+import hashlib
+import queue
+import threading
+import time
+import urllib.request
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class Sha256Hasher:
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.elapsed = 0.0
+
+    # Updates the hash with the data chunk and accumulates the time spent hashing.
+    def update(self, data):
+        start = time.perf_counter()
+        self._hash.update(data)
+        self.elapsed += time.perf_counter() - start
+        self.size += len(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest().lower()
+
+    # Returns the hashing throughput in MB/s.
+    def throughput(self):
+        if self.elapsed == 0:
+            return 0.0
+        return self.size / self.elapsed / (1024 * 1024)
+
+    # Returns a message with the hash and the hashing throughput.
+    def report(self, name: str):
+        return "'{0}' SHA-256={1} ({2:.1f} MB hashed at {3:.1f} MB/s)".format(
+            name, self.hexdigest(), self.size / (1024 * 1024), self.throughput())
+
+    # Raises exception if the hash does not match the expected SHA-256 hash.
+    def validate(self, name: str, sha256: str):
+        if self.hexdigest() != sha256.lower():
+            raise Exception("SHA-256 hash validation of '{0}' failed.".format(name))
+
+
+# Reads the file in chunks and returns Sha256Hasher with the file's hash.
+# If overlap is True, the next chunk is read by a background thread
+# while the current chunk is hashed.
+def file_sha256(filepath: str, chunk_size=CHUNK_SIZE, overlap=True):
+    hasher = Sha256Hasher()
+
+    with open(filepath, 'rb') as f:
+        if not overlap:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                hasher.update(chunk)
+            return hasher
+
+        chunks = queue.Queue(maxsize=2)
+        errors = []
+
+        def read_chunks():
+            try:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    chunks.put(chunk)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                chunks.put(None)
+
+        reader = threading.Thread(target=read_chunks, daemon=True)
+        reader.start()
+
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            hasher.update(chunk)
+
+        reader.join()
+
+        if errors:
+            raise errors[0]
+
+    return hasher
+
+
+# Downloads the file from the URL and returns Sha256Hasher with the file's hash.
+# The hash is computed while the file is downloaded, so validation does not require another pass over the file.
+def download_url(url: str, filepath: str, chunk_size=CHUNK_SIZE):
+    hasher = Sha256Hasher()
+
+    with urllib.request.urlopen(url) as response, open(filepath, 'wb') as f:
+        for chunk in iter(lambda: response.read(chunk_size), b''):
+            hasher.update(chunk)
+            f.write(chunk)
+
+    return hasher
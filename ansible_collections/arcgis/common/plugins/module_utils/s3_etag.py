@@ -0,0 +1,99 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Validation of local files against S3 object ETags.
+#
+# ETag of an object uploaded in a single request is the MD5 hash of the object.
+# ETag of an object uploaded using multipart upload is the MD5 hash of the concatenated
+# MD5 hashes of the parts followed by '-' and the number of parts. The part size is not
+# recorded in the ETag, so it is inferred from the object size, the number of parts,
+# and the part sizes commonly used by S3 clients.
+
+import hashlib
+import math
+
+CHUNK_SIZE = 8 * 1024 * 1024
+MB = 1024 * 1024
+
+# Part sizes used by AWS CLI, boto3, and repository scripts
+COMMON_PART_SIZES = [8 * MB, 16 * MB, 5 * MB, 64 * MB, 32 * MB, 100 * MB, 128 * MB, 256 * MB, 512 * MB]
+
+
+# Returns ETag of the file uploaded in parts of the specified size, or MD5 hash of the file if part_size is None.
+def file_etag(filepath: str, part_size=None):
+    if part_size is None:
+        md5 = hashlib.md5()
+
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                md5.update(chunk)
+
+        return md5.hexdigest()
+
+    digests = []
+
+    with open(filepath, 'rb') as f:
+        while True:
+            part_md5 = hashlib.md5()
+            remaining = part_size
+
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                part_md5.update(chunk)
+                remaining -= len(chunk)
+
+            if remaining == part_size and digests:
+                break
+
+            digests.append(part_md5.digest())
+
+            if remaining > 0:
+                break
+
+    return '{0}-{1}'.format(hashlib.md5(b''.join(digests)).hexdigest(), len(digests))
+
+
+# Returns the part sizes that split an object of the specified size into the specified number of parts.
+def part_size_candidates(size: int, parts: int):
+    exact = math.ceil(size / parts) if parts > 0 else size
+    candidates = [math.ceil(exact / MB) * MB] + COMMON_PART_SIZES + [exact]
+
+    result = []
+
+    for part_size in candidates:
+        if part_size > 0 and part_size not in result and max(1, math.ceil(size / part_size)) == parts:
+            result.append(part_size)
+
+    return result
+
+
+# Returns True if the file matches the S3 object ETag.
+def etag_matches(filepath: str, etag: str, size: int):
+    etag = etag.strip('"').lower()
+
+    if '-' not in etag:
+        return file_etag(filepath) == etag
+
+    try:
+        parts = int(etag.split('-')[1])
+    except ValueError:
+        return False
+
+    for part_size in part_size_candidates(size, parts):
+        if file_etag(filepath, part_size) == etag:
+            return True
+
+    return False
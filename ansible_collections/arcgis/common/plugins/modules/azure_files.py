@@ -0,0 +1,407 @@
+#!/usr/bin/python
+
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: azure_files
+
+short_description: Downloads files from Azure Blob Storage container to local directories
+
+version_added: "0.1.0"
+
+description:
+    - Downloads software setups and patches specified in the manifest file from Azure Blob Storage container to local software repository directories.
+    - The files are downloaded using Azure Storage Blob SDK for Python, so Azure CLI is not required on the host.
+      Large blobs are downloaded by parallel ranged requests.
+    - The downloaded files are verified against the SHA-256 hashes specified in the manifest, SHA-256 metadata of the blobs, or Content-MD5 of the blobs.
+    - The verified files are recorded in .repository-ledger.json file in the local archives directory with their sizes, modification times, and inodes.
+      The files that did not change since they were verified are not hashed again.
+    - Patches are listed from the container page by page. Only new patches and patches whose ETag or size changed are downloaded.
+
+requirements:
+    - azure-storage-blob python module
+    - azure-identity python module
+    - Managed identity assigned to the VM or Azure credentials configured on the host
+
+options:
+    manifest:
+        description:
+            - Path to the manifest file that contains the list of files to download from Azure Blob Storage container.
+            - The storage account, container, authentication mode, and managed identity client ID are specified by
+              arcgis.repository.server.account_name, container_name, auth_mode, and client_id properties of the manifest.
+        required: true
+        type: str
+    workers:
+        description: Number of files downloaded concurrently.
+        required: false
+        type: int
+        default: 4
+    chunk_size:
+        description: Size in MB of the byte ranges downloaded in parallel from large blobs.
+        required: false
+        type: int
+        default: 32
+    max_concurrency:
+        description: Maximum number of parallel ranged requests used to download a single file.
+        required: false
+        type: int
+        default: 8
+    prune_patches:
+        description: Delete local patches that match the patch patterns but are no longer present in the container.
+        required: false
+        type: bool
+        default: false
+'''
+
+EXAMPLES = r'''
+- name: Download setups from private Azure Blob Storage repository
+  arcgis.common.azure_files:
+    manifest: '/opt/software/arcgis-enterprise-azure-files-12.0.json'
+
+- name: Download setups from private Azure Blob Storage repository using 8 concurrent downloads
+  arcgis.common.azure_files:
+    manifest: '/opt/software/arcgis-enterprise-azure-files-12.0.json'
+    workers: 8
+'''
+
+RETURN = r'''
+output:
+    description: The output messages that the module generates.
+    type: list
+    returned: always
+    elements: str
+hashes:
+    description: SHA-256 hashes of the verified files with the hashing throughput.
+    type: list
+    returned: always
+    elements: str
+'''
+
+import traceback
+import fnmatch
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib import Path
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.basic import missing_required_lib
+from ansible_collections.arcgis.common.plugins.module_utils.hash_utils import file_sha256
+from ansible_collections.arcgis.common.plugins.module_utils.file_ledger import FileLedger, LEDGER_FILENAME
+from ansible_collections.arcgis.common.plugins.module_utils.s3_etag import file_etag
+
+AZURE_IMP_ERR = None
+
+try:
+    import requests
+    from azure.core import MatchConditions
+    from azure.core.exceptions import ResourceNotFoundError
+    from azure.core.pipeline.transport import RequestsTransport
+    from azure.identity import DefaultAzureCredential
+    from azure.storage.blob import BlobServiceClient
+    HAS_AZURE = True
+except:
+    HAS_AZURE = False
+    AZURE_IMP_ERR = traceback.format_exc()
+
+DEFAULT_WORKERS = 4
+DEFAULT_CHUNK_SIZE = 32 # MB
+DEFAULT_MAX_CONCURRENCY = 8
+
+def container_client_from_manifest(server: dict, pool_size: int, chunk_size: int):
+    """
+    Returns the container client for the repository server specified in the manifest.
+
+    If auth_mode is 'key', the storage account key specified by account_key property is used.
+    Otherwise, the client is authenticated by the managed identity with the specified client ID
+    or by other credentials supported by DefaultAzureCredential.
+    """
+
+    account_url = server.get('endpoint', 'https://{0}.blob.core.windows.net'.format(server['account_name']))
+
+    if server.get('auth_mode') == 'key':
+        credential = {'account_name': server['account_name'], 'account_key': server['account_key']}
+    elif server.get('client_id'):
+        credential = DefaultAzureCredential(managed_identity_client_id=server['client_id'])
+    else:
+        credential = DefaultAzureCredential()
+
+    # The client is shared by all the downloads, so the connection pool must fit all the concurrent requests.
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    # The first ranged request downloads one chunk, and the rest of the blob is downloaded
+    # by parallel ranged requests of the chunk size.
+    service_client = BlobServiceClient(account_url, credential=credential,
+                                       transport=RequestsTransport(session=session, session_owner=False),
+                                       max_single_get_size=chunk_size * 1024 * 1024,
+                                       max_chunk_get_size=chunk_size * 1024 * 1024)
+
+    return service_client.get_container_client(server['container_name'])
+
+
+def blob_checksums(properties):
+    """
+    Returns (sha256, etag, md5) tuple with the SHA-256 hash metadata, ETag, and hex-encoded Content-MD5 of the blob.
+    """
+
+    metadata = properties.metadata or {}
+    sha256 = metadata.get('sha256')
+    content_md5 = properties.content_settings.content_md5 if properties.content_settings else None
+    md5 = bytes(content_md5).hex() if content_md5 else None
+
+    return sha256.lower() if sha256 else None, properties.etag, md5
+
+
+def verify_file(filepath: str, sha256: str, md5: str, hashes=None):
+    """
+    Verifies the local file against the SHA-256 hash, or against the Content-MD5 of the blob if the hash is not known.
+    The file is hashed in chunks, so the memory usage does not depend on the file size.
+    """
+
+    if not os.path.exists(filepath):
+        return False
+
+    if sha256:
+        hasher = file_sha256(filepath)
+
+        if hashes is not None:
+            hashes.append(hasher.report(filepath))
+
+        return hasher.hexdigest() == sha256
+
+    if md5:
+        return file_etag(filepath) == md5
+
+    return False
+
+
+def download_blob(container_client, blob_name: str, filepath: str, sha256: str, properties,
+                  max_concurrency: int, is_patch: bool, ledger: FileLedger):
+    """
+    Downloads the blob from the container unless the verified local file already exists.
+
+    Local files recorded in the ledger are not verified again unless they changed since.
+    Other files are verified against the expected SHA-256 hash, the blob's SHA-256 metadata,
+    or the blob's Content-MD5. Local files with size different from the blob size are downloaded
+    without verification. The downloaded files are verified and recorded in the ledger.
+    If the blob properties are not specified, they are retrieved from the container.
+    Returns (changed, output, hashes) tuple.
+    """
+
+    output = []
+    hashes = []
+
+    try:
+        blob_client = container_client.get_blob_client(blob_name)
+
+        if properties is None:
+            properties = blob_client.get_blob_properties()
+
+        blob_sha256, etag, md5 = blob_checksums(properties)
+
+        if sha256 is None:
+            sha256 = blob_sha256
+
+        if os.path.exists(filepath) and os.path.getsize(filepath) == properties.size:
+            if ledger.is_verified(filepath, sha256, etag):
+                output.append("Local file '{0}' already exists.".format(filepath))
+                return False, output, hashes
+
+            if verify_file(filepath, sha256, md5, hashes) or (not sha256 and not md5):
+                ledger.record(filepath, sha256, etag)
+                output.append("Local file '{0}' already exists.".format(filepath))
+                return False, output, hashes
+
+        # The ETag condition prevents mixing ranges of different blob versions if the blob is replaced during the download.
+        with open(filepath, 'wb') as f:
+            blob_client.download_blob(max_concurrency=max_concurrency, etag=etag,
+                                      match_condition=MatchConditions.IfNotModified).readinto(f)
+
+        # Files without SHA-256 hash and Content-MD5 cannot be verified
+        if (sha256 or md5) and not verify_file(filepath, sha256, md5, hashes):
+            ledger.remove(filepath)
+            os.remove(filepath)
+            raise Exception("The downloaded file does not match the expected checksum.")
+
+        ledger.record(filepath, sha256, etag)
+
+        kind = 'Patch' if is_patch else 'File'
+        output.append("{0} '{1}' downloaded successfully.".format(kind, blob_name))
+
+        return True, output, hashes
+    except ResourceNotFoundError:
+        raise Exception("Blob '{0}' is not found in container '{1}'.".format(blob_name, container_client.container_name))
+    except Exception as e:
+        raise Exception("Failed to download blob '{0}' from container '{1}'. {2}".format(
+                        blob_name, container_client.container_name, str(e)))
+
+
+def download_azure_files(manifest: str, workers=DEFAULT_WORKERS,
+                         chunk_size=DEFAULT_CHUNK_SIZE,
+                         max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                         prune_patches=False):
+    """
+    Downloads files specified in the manifest file from Azure Blob Storage container to local directories.
+    The files are downloaded concurrently by the specified number of workers,
+    and large files are downloaded using parallel ranged requests.
+    The verified files are recorded in the ledger file in the local archives directory.
+    If prune_patches is True, local patches that are not present in the container are deleted.
+    Returns (changed, output, hashes) tuple.
+    """
+
+    with open(manifest, 'r') as f:
+        data = json.load(f)
+
+    if 'arcgis' not in data or 'repository' not in data['arcgis']:
+        raise Exception('JSON file format is invalid.')
+
+    repository = data['arcgis']['repository']
+
+    workers = max(1, workers)
+    max_concurrency = max(1, max_concurrency)
+
+    container_client = container_client_from_manifest(repository['server'], workers * max_concurrency, chunk_size)
+
+    local_archives = repository['local_archives']
+    local_patches = repository.get('local_patches', local_archives)
+    patch_notification = repository.get('patch_notification', {})
+    patches_subfolder = patch_notification.get('subfolder')
+    patches = patch_notification.get('patches', [])
+
+    # Create local archives and patches directories if they do not exist.
+    Path(local_archives).mkdir(parents=True, exist_ok=True)
+    Path(local_patches).mkdir(parents=True, exist_ok=True)
+
+    output = []
+    hashes = []
+
+    changed = False
+
+    ledger = FileLedger(local_archives).load()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+
+            # Download setups
+
+            files = repository.get('files', {})
+
+            for filename, props in files.items():
+                subfolder = props['subfolder'] if 'subfolder' in props else None
+                sha256 = props['sha256'].lower() if 'sha256' in props else None
+                blob_name = "{0}/{1}".format(subfolder, filename) if subfolder else filename
+                filepath = os.path.join(local_archives, filename)
+
+                futures.append(executor.submit(download_blob, container_client, blob_name, filepath,
+                                               sha256, None, max_concurrency, False, ledger))
+
+            # Download patches
+            # The blobs are listed with metadata, so the patches do not require additional requests
+            # to retrieve the blob properties. The patches are submitted for download while the next
+            # pages of the blobs are listed.
+
+            patch_files = set()
+
+            if patches_subfolder and patches:
+                for blob in container_client.list_blobs(name_starts_with=patches_subfolder.rstrip('/') + '/',
+                                                        include=['metadata']):
+                    filename = os.path.basename(blob.name)
+                    if any(fnmatch.fnmatch(filename, patch) for patch in patches):
+                        filepath = os.path.join(local_patches, filename)
+                        patch_files.add(filename)
+
+                        futures.append(executor.submit(download_blob, container_client, blob.name, filepath,
+                                                       None, blob, max_concurrency, True, ledger))
+
+            # The results are collected in the manifest order to keep the output deterministic.
+            for future in futures:
+                file_changed, file_output, file_hashes = future.result()
+                changed = changed or file_changed
+                output.extend(file_output)
+                hashes.extend(file_hashes)
+
+        if prune_patches:
+            for filename in sorted(os.listdir(local_patches)):
+                filepath = os.path.join(local_patches, filename)
+
+                # Setups and the ledger are never pruned, even if the patches are stored in the archives directory.
+                if filename in patch_files or filename in files or filename == LEDGER_FILENAME:
+                    continue
+
+                if os.path.isfile(filepath) and any(fnmatch.fnmatch(filename, patch) for patch in patches):
+                    os.remove(filepath)
+                    ledger.remove(filepath)
+                    changed = True
+                    output.append("Patch '{0}' deleted.".format(filepath))
+    finally:
+        ledger.save()
+
+    return changed, output, hashes
+
+
+def run_module():
+    module_args = dict(
+        manifest=dict(type='str', required=True),
+        workers=dict(type='int', required=False, default=DEFAULT_WORKERS),
+        chunk_size=dict(type='int', required=False, default=DEFAULT_CHUNK_SIZE),
+        max_concurrency=dict(type='int', required=False, default=DEFAULT_MAX_CONCURRENCY),
+        prune_patches=dict(type='bool', required=False, default=False)
+    )
+
+    result = dict(
+        changed=False,
+        output='',
+        hashes=[]
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    if not HAS_AZURE:
+        module.fail_json(msg=missing_required_lib("azure-storage-blob and azure-identity"),
+                         exception=AZURE_IMP_ERR)
+
+    if module.check_mode:
+        module.exit_json(**result)
+
+    try:
+        result['changed'], result['output'], result['hashes'] = download_azure_files(module.params['manifest'],
+                                                                                     module.params['workers'],
+                                                                                     module.params['chunk_size'],
+                                                                                     module.params['max_concurrency'],
+                                                                                     module.params['prune_patches'])
+
+        module.exit_json(**result)
+    except Exception as e:
+        module.fail_json(msg=str(e), **result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 #!/usr/bin/python
 
-# Copyright 2024 Esri
+# Copyright 2024-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -25,7 +25,14 @@ short_description: Installs ArcGIS patches
 
 version_added: "0.1.0"
 
-description: The module installs hot fixes and patches for ArcGIS software.
+description:
+    - The module installs hot fixes and patches for ArcGIS software.
+    - The patch log is read once, and the patches already recorded in the log are skipped.
+    - Only the directories of the patch archives that contain applypatch or Patch.sh scripts are extracted.
+      The next patch archive is extracted in the background while the current patch is being installed.
+    - In check mode, the module does not extract the patch archives. It reads the tar headers of the archives
+      that are not recorded in the patch log and returns the installation plan with the archives that contain
+      installer scripts and their uncompressed sizes.
 
 options:
     patch:
@@ -53,6 +60,15 @@ EXAMPLES = r'''
     dir: '/opt/software/archives/patches'
     log: '/opt/arcgis/server/.ESRI_S_PATCH_LOG'
     product: 'server'
+
+- name: Plan installation of ArcGIS Server 11.3 patches
+  arcgis.common.install_patches:
+    patch: 'ArcGIS-113-S-*.tar.gz'
+    dir: '/opt/software/archives/patches'
+    log: '/opt/arcgis/server/.ESRI_S_PATCH_LOG'
+    product: 'server'
+  check_mode: true
+  register: patches_plan
 '''
 
 RETURN = r'''
@@ -60,26 +76,216 @@ output:
     description: The output messages that the module generates.
     type: str
     returned: always
+plan:
+    description:
+        - The patch installation plan. Each item includes the patch file name, whether the patch is already installed,
+          the installer scripts in the archive, and the uncompressed sizes in bytes of the archive and of the extracted
+          installer directories. The sizes are not retrieved for the installed patches.
+    type: list
+    elements: dict
+    returned: in check mode
+total_size:
+    description: Total uncompressed size in bytes of the extracted installer directories of the patches to be installed.
+    type: int
+    returned: in check mode
 '''
 
 import glob
 import os
+import shutil
 import tarfile
 import tempfile
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from ansible.module_utils.basic import AnsibleModule
 
-def patch_installed(qfe_file, log):
+INSTALLER_SCRIPTS = ['applypatch', 'Patch.sh']
+
+
+class PatchInstallError(Exception):
+
+    def __init__(self, message, changed=False):
+        super().__init__(message)
+        self.changed = changed
+
+
+# Reads the patch log once and returns its content.
+def read_patch_log(log):
     if not os.path.exists(log):
-        return False
-    
-    with open(log) as f:
-        for line in f:
-            if line.find(qfe_file) > 0:
-                return True
+        return ''
+
+    with open(log, errors='replace') as f:
+        return f.read()
+
+
+# Returns True if the patch file name is found anywhere in the patch log.
+def patch_installed(qfe_file, patch_log):
+    return qfe_file in patch_log
+
+
+def member_path(member):
+    return os.path.normpath(member.name).split('/')
+
+
+# Returns the tar archive members in the top-level directories that contain installer scripts.
+def installer_members(members):
+    members = list(members)
+    installer_dirs = set()
+
+    for member in members:
+        path = member_path(member)
+        if len(path) == 2 and path[1] in INSTALLER_SCRIPTS and member.isfile():
+            installer_dirs.add(path[0])
+
+    return [m for m in members if member_path(m)[0] in installer_dirs]
+
+
+# Extracts the directories with installer scripts of the patch archive to a new temporary directory.
+def extract_patch(patch):
+    tmpdir = tempfile.mkdtemp()
+
+    try:
+        with tarfile.open(patch) as tar:
+            tar.extractall(tmpdir, members=installer_members(tar.getmembers()))
+    except:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+
+    return tmpdir
+
+
+# Runs 'applypatch' and 'Patch.sh' scripts extracted to the directory.
+# Returns True if the patch was installed.
+def apply_patch(tmpdir, qfe_file, product, output):
+    changed = False
+
+    # Run 'applypatch' script if it exists.
+    for applypatch in glob.glob("{0}/*/applypatch".format(tmpdir)):
+        args = "-s"
+        if product is not None:
+            args += " -{0}".format(product)
+
+        try:
+            subprocess.check_output("{0} {1}".format(applypatch, args), shell=True, universal_newlines=True)
+            output.append("Patch '{0}' installed successfully".format(qfe_file))
+            changed = True
+        except subprocess.CalledProcessError as ex:
+            if ex.output.find("This patch is already installed.") > 0:
+                output.append("Patch '{0}' is already installed".format(qfe_file))
+            else:
+                raise PatchInstallError(ex.output)
+
+    # Run 'Patch.sh' script if it exists.
+    for patch_sh in glob.glob("{0}/*/Patch.sh".format(tmpdir)):
+        try:
+            subprocess.check_output(patch_sh, shell=True, universal_newlines=True)
+            output.append("Patch '{0}' installed successfully".format(qfe_file))
+            changed = True
+        except subprocess.CalledProcessError as ex:
+            if ex.output.find("this product is already installed.'") > 0:
+                output.append("Patch '{0}' is already installed".format(qfe_file))
+            else:
+                raise PatchInstallError(ex.output)
+
+    return changed
+
+
+# Returns the installation plan of the patch archive.
+# The archive is read sequentially and only the tar headers are inspected, so no files are extracted.
+def plan_patch(patch, patch_log):
+    qfe_file = os.path.basename(patch)
+
+    plan = {
+        'patch': qfe_file,
+        'installed': patch_installed(qfe_file, patch_log),
+        'installers': [],
+        'size': None,
+        'extract_size': None
+    }
+
+    if plan['installed']:
+        return plan
+
+    dir_sizes = {}
+    installers = []
+    size = 0
+
+    # Read the archive in streaming mode, decompressing it once without seeking.
+    with tarfile.open(patch, mode='r|*') as tar:
+        for member in tar:
+            path = member_path(member)
+            size += member.size
+            dir_sizes[path[0]] = dir_sizes.get(path[0], 0) + member.size
+            if len(path) == 2 and path[1] in INSTALLER_SCRIPTS and member.isfile():
+                installers.append('/'.join(path))
+
+    plan['installers'] = sorted(installers)
+    plan['size'] = size
+    plan['extract_size'] = sum(dir_sizes[d] for d in set(installer.split('/')[0] for installer in installers))
+
+    return plan
+
+
+# Returns the installation plan of the patches.
+# The archives are read concurrently, because decompression of the archives is CPU bound.
+def plan_patches(patch_file, log):
+    patch_log = read_patch_log(log)
+
+    patches = sorted(glob.glob(patch_file))
+
+    with ThreadPoolExecutor(max_workers=min(len(patches), os.cpu_count() or 1) or 1) as executor:
+        return list(executor.map(partial(plan_patch, patch_log=patch_log), patches))
+
+
+# Installs the patches that are not recorded in the patch log.
+# The patches are installed one by one, while the next patch archive is extracted by a background worker.
+def install_patches(patch_file, log, product, output):
+    changed = False
+
+    patch_log = read_patch_log(log)
+
+    pending = []
+
+    for patch in sorted(glob.glob(patch_file)):
+        qfe_file = os.path.basename(patch)
+        if patch_installed(qfe_file, patch_log):
+            output.append("Patch '{0}' is already installed".format(qfe_file))
+        else:
+            pending.append(patch)
+
+    if not pending:
+        return changed
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        extraction = executor.submit(extract_patch, pending[0])
+
+        try:
+            for i, patch in enumerate(pending):
+                tmpdir = extraction.result()
+                extraction = executor.submit(extract_patch, pending[i + 1]) if i + 1 < len(pending) else None
+
+                try:
+                    changed = apply_patch(tmpdir, os.path.basename(patch), product, output) or changed
+                finally:
+                    shutil.rmtree(tmpdir, ignore_errors=True)
+        except PatchInstallError as ex:
+            # Report the patches installed before the failure.
+            ex.changed = ex.changed or changed
+            raise
+        except Exception as ex:
+            raise PatchInstallError("Failed to install patches. {0}".format(str(ex)), changed)
+        finally:
+            # Remove the patch extracted in the background if the installation failed.
+            if extraction is not None:
+                try:
+                    shutil.rmtree(extraction.result(), ignore_errors=True)
+                except Exception:
+                    pass
+
+    return changed
 
-    return False
 
 def run_module():
     module_args = dict(
@@ -99,48 +305,37 @@ def run_module():
         supports_check_mode=True
     )
 
+    patch_file = os.path.join(module.params['dir'], module.params['patch'])
+
     if module.check_mode:
-        module.exit_json(**result)
+        try:
+            result['plan'] = plan_patches(patch_file, module.params['log'])
+        except Exception as ex:
+            module.fail_json(msg="Failed to read patches. {0}".format(str(ex)), **result)
 
-    patch_file = os.path.join(module.params['dir'], module.params['patch'])
+        result['total_size'] = 0
 
-    for patch in glob.glob(patch_file):
-        qfe_file = os.path.basename(patch)
-        if patch_installed(qfe_file, module.params['log']):
-            result['output'].append("Patch '{0}' is already installed".format(qfe_file)) 
-        else:
-            # Install the patch
-            with tempfile.TemporaryDirectory() as tmpdir:
-                with tarfile.open(patch) as tar:
-                    tar.extractall(tmpdir)
-                
-                # Run 'applypatch' script if it exists.
-                for applypatch in glob.glob("{0}/*/applypatch".format(tmpdir)):
-                    args = "-s"
-                    if module.params['product'] is not None:
-                        args += " -{0}".format(module.params['product'])    
-
-                    try:
-                        subprocess.check_output("{0} {1}".format(applypatch, args), shell=True)
-                        result['output'].append("Patch '{0}' installed successfully".format(qfe_file))
-                        result['changed'] = True
-                    except subprocess.CalledProcessError as ex:                                                                                                   
-                        if ex.output.find("This patch is already installed.") > 0:
-                            result['output'].append("Patch '{0}' is already installed".format(qfe_file))
-                        else:
-                            module.fail_json(msg=ex.output, **result)
-
-                # Run 'Patch.sh' script if it exists.
-                for patch_sh in glob.glob("{0}/*/Patch.sh".format(tmpdir)):
-                    try:
-                        subprocess.check_output(patch_sh, shell=True)
-                        result['output'].append("Patch '{0}' installed successfully".format(qfe_file))
-                        result['changed'] = True
-                    except subprocess.CalledProcessError as ex:                                                                                                   
-                        if ex.output.find("this product is already installed.'") > 0:
-                            result['output'].append("Patch '{0}' is already installed".format(qfe_file))
-                        else:
-                            module.fail_json(msg=ex.output, **result)
+        for plan in result['plan']:
+            if plan['installed']:
+                result['output'].append("Patch '{0}' is already installed".format(plan['patch']))
+            elif plan['installers']:
+                result['output'].append("Patch '{0}' will be installed using {1} ({2} bytes)".format(
+                                        plan['patch'], ', '.join(plan['installers']), plan['extract_size']))
+                result['total_size'] += plan['extract_size']
+                result['changed'] = True
+            else:
+                result['output'].append("Patch '{0}' does not contain installer scripts".format(plan['patch']))
+
+        module.exit_json(**result)
+
+    try:
+        result['changed'] = install_patches(patch_file, module.params['log'],
+                                            module.params['product'], result['output'])
+    except PatchInstallError as ex:
+        result['changed'] = ex.changed
+        module.fail_json(msg=str(ex), **result)
+    except Exception as ex:
+        module.fail_json(msg="Failed to install patches. {0}".format(str(ex)), **result)
 
     module.exit_json(**result)
 
@@ -1,6 +1,6 @@
 #!/usr/bin/python
 
-# Copyright 2024 Esri
+# Copyright 2024-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -26,7 +26,15 @@ short_description: Downloads files from S3 bucket to local directories
 
 version_added: "0.1.0"
 
-description: Downloads software setups and patches specified in the manifest file from S3 bucket to local software repository directories.
+description:
+    - Downloads software setups and patches specified in the manifest file from S3 bucket to local software repository directories.
+    - The downloaded files are verified against the SHA-256 hashes specified in the manifest, SHA-256 metadata of the S3 objects, or the S3 object ETags.
+    - The verified files are recorded in .repository-ledger.json file in the local archives directory with their sizes, modification times, and inodes.
+      The files that did not change since they were verified are not hashed again.
+    - Patches are listed from the S3 bucket page by page. Only new patches and patches whose ETag or size changed are downloaded.
+    - If shared_cache directory is specified, the files are downloaded from S3 bucket to the shared cache directory only once per deployment.
+      The first host that needs a file downloads and verifies it in the shared cache directory while holding a lock on the file,
+      and the other hosts wait for the lock and then copy or link the verified file to their local directories.
 
 requirements:
     - boto3 python module
@@ -37,12 +45,59 @@ options:
         description: Path to the manifest file that contains the list of files to download from S3 bucket.
         required: true
         type: str
+    workers:
+        description: Number of files downloaded concurrently.
+        required: false
+        type: int
+        default: 4
+    multipart_chunksize:
+        description: Size in MB of the byte ranges downloaded in parallel from large S3 objects.
+        required: false
+        type: int
+        default: 64
+    max_concurrency:
+        description: Maximum number of parallel ranged GET requests used to download a single file.
+        required: false
+        type: int
+        default: 10
+    prune_patches:
+        description: Delete local patches that match the patch patterns but are no longer present in the S3 bucket.
+        required: false
+        type: bool
+        default: false
+    shared_cache:
+        description:
+            - Path to a directory on a file system shared by the deployment hosts, such as EFS or NFS file server mount point.
+            - The file system must support POSIX advisory locks.
+        required: false
+        type: str
+    shared_cache_mode:
+        description: Specifies if the files are copied from the shared cache directory or linked to it by symbolic links.
+        required: false
+        type: str
+        choices: ['copy', 'symlink']
+        default: copy
 '''
 
 EXAMPLES = r'''
 - name: Download setups from private S3 repository
   arcgis.common.s3files:
     manifest: '/opt/software/arcgis-server-s3files-11.2.json'
+
+- name: Download setups from private S3 repository using 8 concurrent downloads
+  arcgis.common.s3files:
+    manifest: '/opt/software/arcgis-server-s3files-11.2.json'
+    workers: 8
+
+- name: Download patches from private S3 repository and delete local patches removed from the repository
+  arcgis.common.s3files:
+    manifest: '/opt/software/arcgis-server-s3files-11.2.json'
+    prune_patches: true
+
+- name: Download setups from private S3 repository once per deployment using shared EFS cache directory
+  arcgis.common.s3files:
+    manifest: '/opt/software/arcgis-server-s3files-11.2.json'
+    shared_cache: '/mnt/efs/software-cache'
 '''
 
 RETURN = r'''
@@ -51,44 +106,265 @@ output:
     type: list
     returned: always
     elements: str
+hashes:
+    description: SHA-256 hashes of the verified files with the hashing throughput.
+    type: list
+    returned: always
+    elements: str
 '''
 
 import traceback
-import hashlib
 import fnmatch
 import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 from pathlib import Path
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.basic import missing_required_lib
+from ansible_collections.arcgis.common.plugins.module_utils.hash_utils import file_sha256
+from ansible_collections.arcgis.common.plugins.module_utils.file_ledger import FileLedger, LEDGER_FILENAME
+from ansible_collections.arcgis.common.plugins.module_utils.s3_etag import etag_matches
 
 BOTO3_IMP_ERR = None
 
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
     HAS_BOTO3 = True
 except:
     HAS_BOTO3 = False
     BOTO3_IMP_ERR = traceback.format_exc()
 
-def validate_sha256(filepath: str, sha256: str):
+FCNTL_IMP_ERR = None
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+    FCNTL_IMP_ERR = traceback.format_exc()
+
+DEFAULT_WORKERS = 4
+DEFAULT_MULTIPART_CHUNKSIZE = 64 # MB
+DEFAULT_MAX_CONCURRENCY = 10
+
+def validate_sha256(filepath: str, sha256: str, hashes=None):
     """
     Validates the SHA-256 hash of the file.
+    The file is hashed in chunks, so the memory usage does not depend on the file size.
+    """
+
+    if not sha256 or not os.path.exists(filepath):
+        return False
+
+    hasher = file_sha256(filepath)
+
+    if hashes is not None:
+        hashes.append(hasher.report(filepath))
+
+    return hasher.hexdigest() == sha256
+
+
+def object_checksums(s3_client, bucket_name: str, s3_key: str):
+    """
+    Returns (sha256, etag, md5_etag) tuple with the SHA-256 hash metadata and ETag of the S3 object.
+    md5_etag is None if the ETag is not based on MD5 hash of the object content,
+    which is the case for objects encrypted with KMS keys.
+    """
+
+    response = s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+
+    sha256 = response.get('Metadata', {}).get('sha256')
+    etag = response.get('ETag')
+    md5_etag = None if response.get('ServerSideEncryption') == 'aws:kms' else etag
+
+    return sha256.lower() if sha256 else None, etag, md5_etag
+
+
+def verify_file(filepath: str, sha256: str, md5_etag: str, hashes=None):
+    """
+    Verifies the local file against the SHA-256 hash, or against the S3 ETag if the hash is not known.
+    """
+
+    if sha256:
+        return validate_sha256(filepath, sha256, hashes)
+
+    if md5_etag:
+        return etag_matches(filepath, md5_etag, os.path.getsize(filepath))
+
+    return False
+
+
+def cache_s3_file(s3_client, bucket_name: str, s3_key: str, shared_cache: str, sha256: str, etag: str,
+                  md5_etag: str, transfer_config, hashes):
+    """
+    Downloads the file from S3 bucket to the shared cache directory unless the verified file is already cached.
+
+    The cached file is checked and downloaded while holding an exclusive lock on the '.lock' file
+    next to it, so the file is downloaded only by the first host that needs it, while the other hosts
+    wait for the lock and reuse the verified file. The verified cached files are recorded in
+    '.verified.json' ledger files next to them.
+    Returns (cached_path, downloaded) tuple.
     """
 
-    actual_sha256 = None
-    if os.path.exists(filepath):
-        with open(filepath, 'rb') as f:
-            sha256_hash = hashlib.sha256()
-            sha256_hash.update(f.read())
-            actual_sha256 = sha256_hash.hexdigest().lower()
-    return actual_sha256 and actual_sha256 == sha256
+    cached_path = os.path.join(shared_cache, *s3_key.split('/'))
+    cache_dir = os.path.dirname(cached_path)
 
+    os.makedirs(cache_dir, exist_ok=True)
 
-def download_s3_files(manifest: str):
+    with open(cached_path + '.lock', 'a') as lock_file:
+        fcntl.lockf(lock_file, fcntl.LOCK_EX)
+
+        try:
+            ledger = FileLedger(cache_dir, os.path.basename(cached_path) + '.verified.json').load()
+
+            if os.path.exists(cached_path):
+                if ledger.is_verified(cached_path, sha256, etag):
+                    return cached_path, False
+
+                if verify_file(cached_path, sha256, md5_etag, hashes):
+                    ledger.record(cached_path, sha256, etag)
+                    ledger.save()
+                    return cached_path, False
+
+            # The file is downloaded to a temporary file, so the cached file is never partially written.
+            download_path = cached_path + '.download'
+
+            s3_client.download_file(bucket_name, s3_key, download_path, Config=transfer_config)
+
+            # Files without SHA-256 hash and MD5-based ETag cannot be verified
+            if (sha256 or md5_etag) and not verify_file(download_path, sha256, md5_etag, hashes):
+                os.remove(download_path)
+                raise Exception("The downloaded file does not match the expected checksum.")
+
+            os.replace(download_path, cached_path)
+
+            ledger.record(cached_path, sha256, etag)
+            ledger.save()
+
+            return cached_path, True
+        finally:
+            fcntl.lockf(lock_file, fcntl.LOCK_UN)
+
+
+def install_cached_file(cached_path: str, filepath: str, mode: str):
+    """
+    Copies the cached file to the local file path or replaces the local file by a symbolic link to the cached file.
+    """
+
+    tmp_path = filepath + '.tmp'
+
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+
+    if mode == 'symlink':
+        os.symlink(cached_path, tmp_path)
+    else:
+        shutil.copyfile(cached_path, tmp_path)
+
+    os.replace(tmp_path, filepath)
+
+
+def download_s3_file(s3_client, bucket_name: str, s3_key: str, filepath: str, sha256: str, etag: str, size: int,
+                     transfer_config, is_patch: bool, ledger: FileLedger,
+                     shared_cache=None, shared_cache_mode='copy'):
+    """
+    Downloads the file from S3 bucket unless the verified local file already exists.
+
+    Local files recorded in the ledger are not verified again unless they changed since.
+    Other files are verified against the expected SHA-256 hash, the S3 object's SHA-256 metadata,
+    or the S3 object's ETag. Local files with size different from the S3 object size are downloaded
+    without verification. The downloaded files are verified and recorded in the ledger.
+    If shared_cache is specified, the file is downloaded to the shared cache directory and
+    copied or linked from there.
+    Returns (changed, output, hashes) tuple.
+    """
+
+    output = []
+    hashes = []
+
+    try:
+        md5_etag = None
+        checksums_retrieved = False
+
+        if sha256 is None and etag is None:
+            sha256, etag, md5_etag = object_checksums(s3_client, bucket_name, s3_key)
+            checksums_retrieved = True
+
+        if os.path.exists(filepath) and (size is None or os.path.getsize(filepath) == size):
+            if ledger.is_verified(filepath, sha256, etag):
+                output.append("Local file '{0}' already exists.".format(filepath))
+                return False, output, hashes
+
+            if sha256 is None and not checksums_retrieved:
+                sha256, etag, md5_etag = object_checksums(s3_client, bucket_name, s3_key)
+                checksums_retrieved = True
+
+            if verify_file(filepath, sha256, md5_etag, hashes) or (not sha256 and not md5_etag):
+                ledger.record(filepath, sha256, etag)
+                output.append("Local file '{0}' already exists.".format(filepath))
+                return False, output, hashes
+
+        kind = 'Patch' if is_patch else 'File'
+
+        if shared_cache:
+            # The cached file is verified before it is downloaded, so the checksums must be known.
+            if sha256 is None and not checksums_retrieved:
+                sha256, etag, md5_etag = object_checksums(s3_client, bucket_name, s3_key)
+
+            cached_path, downloaded = cache_s3_file(s3_client, bucket_name, s3_key, shared_cache,
+                                                    sha256, etag, md5_etag, transfer_config, hashes)
+
+            install_cached_file(cached_path, filepath, shared_cache_mode)
+
+            ledger.record(filepath, sha256, etag)
+
+            if downloaded:
+                output.append("{0} '{1}' downloaded successfully to shared cache.".format(kind, s3_key))
+
+            output.append("{0} '{1}' {2} from shared cache.".format(
+                kind, s3_key, 'linked' if shared_cache_mode == 'symlink' else 'copied'))
+
+            return True, output, hashes
+
+        s3_client.download_file(bucket_name, s3_key, filepath, Config=transfer_config)
+
+        if sha256 is None and not checksums_retrieved:
+            sha256, etag, md5_etag = object_checksums(s3_client, bucket_name, s3_key)
+
+        # Files without SHA-256 hash and MD5-based ETag cannot be verified
+        if (sha256 or md5_etag) and not verify_file(filepath, sha256, md5_etag, hashes):
+            ledger.remove(filepath)
+            os.remove(filepath)
+            raise Exception("The downloaded file does not match the expected checksum.")
+
+        ledger.record(filepath, sha256, etag)
+
+        output.append("{0} '{1}' downloaded successfully.".format(kind, s3_key))
+
+        return True, output, hashes
+    except Exception as e:
+        raise Exception("Failed to download file '{0}' from S3 bucket '{1}'. {2}".format(s3_key, bucket_name, str(e)))
+
+
+def download_s3_files(manifest: str, workers=DEFAULT_WORKERS,
+                      multipart_chunksize=DEFAULT_MULTIPART_CHUNKSIZE,
+                      max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                      prune_patches=False,
+                      shared_cache=None,
+                      shared_cache_mode='copy'):
     """
     Downloads files specified in the manifest file from S3 bucket to local directories.
+    The files are downloaded concurrently by the specified number of workers,
+    and large files are downloaded using parallel ranged GET requests.
+    The verified files are recorded in the ledger file in the local archives directory.
+    If prune_patches is True, local patches that are not present in the S3 bucket are deleted.
+    If shared_cache is specified, the files are downloaded once to the shared cache directory
+    and copied or linked from there to the local directories.
+    Returns (changed, output, hashes) tuple.
     """
 
     with open(manifest, 'r') as f:
@@ -97,7 +373,18 @@ def download_s3_files(manifest: str):
     bucket_name = data['arcgis']['repository']['server']['s3bucket']
     region = data['arcgis']['repository']['server']['region']
 
-    s3_client = boto3.client('s3', region_name=region)
+    workers = max(1, workers)
+    max_concurrency = max(1, max_concurrency)
+
+    # The client is shared by all the downloads, so the connection pool must fit all the concurrent requests.
+    s3_client = boto3.client('s3', region_name=region,
+                             config=Config(max_pool_connections=workers * max_concurrency))
+
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_chunksize * 1024 * 1024,
+        multipart_chunksize=multipart_chunksize * 1024 * 1024,
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1)
 
     if 'arcgis' not in data or 'repository' not in data['arcgis']:
         raise Exception('JSON file format is invalid.')
@@ -116,60 +403,90 @@ def download_s3_files(manifest: str):
     patches_path.mkdir(parents=True, exist_ok=True)
 
     output = []
+    hashes = []
     
     changed = False
 
-    # Download files
+    ledger = FileLedger(local_archives).load()
 
-    files = data['arcgis']['repository']['files']
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
 
-    for filename, props in files.items():
-        subfolder = props['subfolder'] if 'subfolder' in props else None
-        sha256 = props['sha256'].lower() if 'sha256' in props else None
-        s3_key = "{0}/{1}".format(subfolder, filename) if subfolder else filename
-        filepath = os.path.join(local_archives, filename)
-        
-        try:
-            if os.path.exists(filepath) and validate_sha256(filepath, sha256):
-                output.append("Local file '{0}' already exists.".format(filepath))
-            else:
-                s3_client.download_file(bucket_name, s3_key, filepath)
-                changed = True
-                output.append("File '{0}' downloaded successfully.".format(s3_key))
-        except Exception as e:
-            raise Exception("Failed to download file '{0}' from S3 bucket '{1}'. {2}".format(s3_key, bucket_name, str(e)))
-        
-    # Download patches
-
-    keys = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=patchs_subfolder)
-
-    if 'Contents' in keys:
-        for key in keys['Contents']:
-            filename = os.path.basename(key['Key'])
-            if any(fnmatch.fnmatch(filename, patch) for patch in patches):
+            # Download setups
+
+            files = data['arcgis']['repository']['files']
+
+            for filename, props in files.items():
+                subfolder = props['subfolder'] if 'subfolder' in props else None
+                sha256 = props['sha256'].lower() if 'sha256' in props else None
+                s3_key = "{0}/{1}".format(subfolder, filename) if subfolder else filename
+                filepath = os.path.join(local_archives, filename)
+
+                futures.append(executor.submit(download_s3_file, s3_client, bucket_name, s3_key, filepath,
+                                               sha256, None, None, transfer_config, False, ledger,
+                                               shared_cache, shared_cache_mode))
+
+            # Download patches
+            # The patches are submitted for download while the next pages of the patches are listed.
+
+            patch_files = set()
+
+            paginator = s3_client.get_paginator('list_objects_v2')
+
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=patchs_subfolder):
+                for key in page.get('Contents', []):
+                    filename = os.path.basename(key['Key'])
+                    if any(fnmatch.fnmatch(filename, patch) for patch in patches):
+                        filepath = os.path.join(local_patches, filename)
+                        patch_files.add(filename)
+
+                        futures.append(executor.submit(download_s3_file, s3_client, bucket_name, key['Key'], filepath,
+                                                       None, key.get('ETag'), key.get('Size'),
+                                                       transfer_config, True, ledger,
+                                                       shared_cache, shared_cache_mode))
+
+            # The results are collected in the manifest order to keep the output deterministic.
+            for future in futures:
+                file_changed, file_output, file_hashes = future.result()
+                changed = changed or file_changed
+                output.extend(file_output)
+                hashes.extend(file_hashes)
+
+        if prune_patches:
+            for filename in sorted(os.listdir(local_patches)):
                 filepath = os.path.join(local_patches, filename)
 
-                try:
-                    if os.path.exists(filepath):
-                        output.append("Local file '{0}' already exists.".format(filepath))
-                    else:
-                        s3_client.download_file(bucket_name, key['Key'], filepath)
-                        changed = True
-                        output.append("Patch '{0}' downloaded successfully.".format(key['Key']))
-                except Exception as e:
-                    raise Exception("Failed to download file '{0}' from S3 bucket '{1}'. {2}".format(key['Key'], bucket_name, str(e)))
+                # Setups and the ledger are never pruned, even if the patches are stored in the archives directory.
+                if filename in patch_files or filename in files or filename == LEDGER_FILENAME:
+                    continue
+
+                if os.path.isfile(filepath) and any(fnmatch.fnmatch(filename, patch) for patch in patches):
+                    os.remove(filepath)
+                    ledger.remove(filepath)
+                    changed = True
+                    output.append("Patch '{0}' deleted.".format(filepath))
+    finally:
+        ledger.save()
 
-    return changed, output
+    return changed, output, hashes
 
 
 def run_module():
     module_args = dict(
-        manifest=dict(type='str', required=True)
+        manifest=dict(type='str', required=True),
+        workers=dict(type='int', required=False, default=DEFAULT_WORKERS),
+        multipart_chunksize=dict(type='int', required=False, default=DEFAULT_MULTIPART_CHUNKSIZE),
+        max_concurrency=dict(type='int', required=False, default=DEFAULT_MAX_CONCURRENCY),
+        prune_patches=dict(type='bool', required=False, default=False),
+        shared_cache=dict(type='str', required=False, default=None),
+        shared_cache_mode=dict(type='str', required=False, default='copy', choices=['copy', 'symlink'])
     )
 
     result = dict(
         changed=False,
-        output=''
+        output='',
+        hashes=[]
     )
 
     module = AnsibleModule(
@@ -181,11 +498,21 @@ def run_module():
         module.fail_json(msg=missing_required_lib("boto3"),
                          exception=BOTO3_IMP_ERR)
 
+    if module.params['shared_cache'] and not HAS_FCNTL:
+        module.fail_json(msg="Shared cache requires POSIX file locks that are not supported on this platform.",
+                         exception=FCNTL_IMP_ERR)
+
     if module.check_mode:
         module.exit_json(**result)
 
     try:
-        result['changed'], result['output'] = download_s3_files(module.params['manifest'])
+        result['changed'], result['output'], result['hashes'] = download_s3_files(module.params['manifest'],
+                                                                                  module.params['workers'],
+                                                                                  module.params['multipart_chunksize'],
+                                                                                  module.params['max_concurrency'],
+                                                                                  module.params['prune_patches'],
+                                                                                  module.params['shared_cache'],
+                                                                                  module.params['shared_cache_mode'])
 
         module.exit_json(**result)
     except Exception as e:
@@ -29,8 +29,13 @@ JSON_ATTRIBUTES_PARAMETER='<json_attributes_parameter>'
 ADMIN_URL="https://localhost:11443/arcgis/admin"
 STAGING_LOCATION="/tmp"
 
-# Get the script input parameters in JSON format from SSM Parameter Store
-attributes=$(aws ssm get-parameter --name $JSON_ATTRIBUTES_PARAMETER --query 'Parameter.Value' --with-decryption --output text)
+# Get the script input parameters in JSON format from SSM Parameter Store,
+# or from the file downloaded from S3 if the parameters are too large for SSM parameter.
+if [ -n "$JSON_ATTRIBUTES_FILE" ]; then
+  attributes=$(cat $JSON_ATTRIBUTES_FILE)
+else
+  attributes=$(aws ssm get-parameter --name $JSON_ATTRIBUTES_PARAMETER --query 'Parameter.Value' --with-decryption --output text)
+fi
 
 if [ $? -ne 0 ]; then
   echo "Error: Failed to retrieve '$JSON_ATTRIBUTES_PARAMETER' SSM parameter."
@@ -1,6 +1,6 @@
 #!/bin/bash
 
-# Copyright 2025 Esri
+# Copyright 2025-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -25,8 +25,13 @@
 
 JSON_ATTRIBUTES_PARAMETER='<json_attributes_parameter>'
 
-# Get the script input parameters in JSON format from SSM Parameter Store
-attributes=$(aws ssm get-parameter --name $JSON_ATTRIBUTES_PARAMETER --query 'Parameter.Value' --with-decryption --output text)
+# Get the script input parameters in JSON format from SSM Parameter Store,
+# or from the file downloaded from S3 if the parameters are too large for SSM parameter.
+if [ -n "$JSON_ATTRIBUTES_FILE" ]; then
+  attributes=$(cat $JSON_ATTRIBUTES_FILE)
+else
+  attributes=$(aws ssm get-parameter --name $JSON_ATTRIBUTES_PARAMETER --query 'Parameter.Value' --with-decryption --output text)
+fi
 
 if [ $? -ne 0 ]; then
   echo "Error: Failed to retrieve '$JSON_ATTRIBUTES_PARAMETER' SSM parameter."
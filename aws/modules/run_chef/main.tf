@@ -6,6 +6,15 @@
  * The module runs ssm_run_chef.py python script that creates a SecureString SSM parameter with Chef JSON attributes and
  * runs {var.enterprise_id}-run-chef SSM command on the deployment's EC2 instances in specific roles.
  *
+ * If role_dependencies are specified, Chef runs on the machines of each role after Chef runs on the machines
+ * of the roles it depends on succeeded, and on the machines of independent roles concurrently.
+ * max_concurrency and max_errors variables specify the SSM command rate control for rolling Chef runs.
+ *
+ * If skip_converged variable is set to true, Chef run is skipped on the machines where the last successful
+ * Chef run used the same JSON attributes and cookbooks. The hash of the attributes and cookbooks version
+ * is recorded in ArcGISChefRunHash:<parameter name> tag of the EC2 instances. Don't set skip_converged for Chef runs
+ * that must run every time, such as backups.
+ *
  * ## Requirements
  *
  * The S3 bucket for the SSM command output is retrieved from "/arcgis/{var.enterprise_id}/s3/logs" SSM parameter.
@@ -60,6 +69,6 @@ resource "null_resource" "run_chef" {
       AWS_DEFAULT_REGION = data.aws_region.current.region
     }
 
-    command = "python -m ssm_run_chef -s ${var.enterprise_id} -d ${var.deployment_id} -m ${join(",", var.machine_roles)} -j ${var.parameter_name} -b ${nonsensitive(data.aws_ssm_parameter.output_s3_bucket.value)} -e ${var.execution_timeout}"
+    command = "python -m ssm_run_chef -s ${var.enterprise_id} -d ${var.deployment_id} -m ${join(",", var.machine_roles)} -j ${var.parameter_name} -b ${nonsensitive(data.aws_ssm_parameter.output_s3_bucket.value)} -e ${var.execution_timeout}${length(var.role_dependencies) > 0 ? " -r ${join(",", [for role, deps in var.role_dependencies : "${role}:${join("+", deps)}"])}" : ""}${var.max_concurrency != null ? " -c ${var.max_concurrency}" : ""}${var.max_errors != null ? " -x ${var.max_errors}" : ""}${var.skip_converged ? " -u" : ""}"
   }
 }
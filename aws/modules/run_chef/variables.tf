@@ -58,3 +58,27 @@ variable "execution_timeout" {
   type = number
   default = 3600 # 1 hour
 }
+
+variable "role_dependencies" {
+  description = "Map of machine roles to lists of machine roles that must be configured before them. Chef runs on the machines of independent roles concurrently."
+  type = map(list(string))
+  default = {}
+}
+
+variable "max_concurrency" {
+  description = "Maximum number or percentage of instances that run Chef concurrently, such as \"1\" or \"25%\""
+  type = string
+  default = null
+}
+
+variable "max_errors" {
+  description = "Maximum number or percentage of failed Chef runs before the run is considered failed, such as \"0\" or \"10%\""
+  type = string
+  default = null
+}
+
+variable "skip_converged" {
+  description = "Skip Chef run on the machines that are already converged with the same JSON attributes and cookbooks"
+  type = bool
+  default = false
+}
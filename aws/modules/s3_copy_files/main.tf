@@ -51,6 +51,6 @@ resource "null_resource" "s3_copy_files" {
       AWS_DEFAULT_REGION = data.aws_region.current.region
     }
 
-    command = "python -m s3_copy_files -f ${var.index_file} -b ${var.bucket_name}"
+    command = "python -m s3_copy_files -f ${var.index_file} -b ${var.bucket_name}${var.source_repository != null ? " -o ${var.source_repository}" : ""}"
   }
 }
@@ -1,4 +1,4 @@
-# Copyright 2024 Esri
+# Copyright 2024-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -25,4 +25,10 @@ variable "bucket_name" {
 variable "index_file" {
   description = "Index file local path"
   type = string
+}
+
+variable "source_repository" {
+  description = "Source repository S3 bucket name or Azure Blob Storage container URL to replicate files from"
+  type = string
+  default = null
 } 
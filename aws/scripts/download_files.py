@@ -15,37 +15,31 @@
 # Downloads files from public URLs and My Esri to local filesystem.
 
 import argparse
-import hashlib
 import json
 import os
 import sys
-import urllib
-import urllib.request
 
+import ranged_download
 from downloads_api import DownloadsAPIClient
 from token_service_client import TokenServiceClient
 
-def download_file(url: str, filename: str, download_directory: str, sha256=None):
+def download_file(url: str, filename: str, download_directory: str, sha256=None,
+                  connections=ranged_download.DEFAULT_CONNECTIONS):
     filepath = os.path.join(download_directory, filename)
     
     print("Downloading '{0}' from '{1}'...".format(filename, url))
-    urllib.request.urlretrieve(url, filepath)
+    hasher = ranged_download.download(url, filepath, connections)
 
     if sha256:
         print("Validating SHA256 hash...")
-        
-        with open(filepath, 'rb') as f:
-            sha256_hash = hashlib.sha256()
-            sha256_hash.update(f.read())
-            print("SHA-256=" + sha256_hash.hexdigest())
-            if sha256_hash.hexdigest().lower() != sha256:
-                raise Exception(
-                    "SHA-256 hash validation of '{0}' failed.".format(filename))
+        print(hasher.report(filename))
+        hasher.validate(filename, sha256)
     
     print("File '{0}' downloaded.".format(filename))
 
 
-def download_files(data, download_directory, username, password):
+def download_files(data, download_directory, username, password,
+                   connections=ranged_download.DEFAULT_CONNECTIONS):
     print("Downloading files to '{0}'...".format(download_directory))
     
     if 'server' in data['arcgis']['repository'] and \
@@ -71,17 +65,18 @@ def download_files(data, download_directory, username, password):
 
         if not url:
             # Generate Downloads API URL
-            token = token_service.generate_token(username, password)
+            token = token_service.get_token(username, password)
             url = downloads_api.generate_url(filename, subfolder, token)
 
         try:
-            download_file(url, filename, download_directory, sha256)
+            download_file(url, filename, download_directory, sha256, connections)
         except Exception as e1:
             print(e1)
+            # The retry resumes the download from the last completed segment.
             print("Retrying download of '{0}'...".format(filename))
 
             try:
-                download_file(url, filename, download_directory, sha256)
+                download_file(url, filename, download_directory, sha256, connections)
             except Exception as e2:
                 print(e2)
                 sys.exit(1)
@@ -102,6 +97,9 @@ if __name__ == '__main__':
                         help='Index JSON file path')
     parser.add_argument('-d', dest='download_directory', required=False,
                         help='Directory to download files to')
+    parser.add_argument('-c', dest='connections', required=False, type=int,
+                        default=ranged_download.DEFAULT_CONNECTIONS,
+                        help='Number of parallel connections used to download each file')
 
     args = parser.parse_args()
 
@@ -131,4 +129,4 @@ if __name__ == '__main__':
     else:
         download_directory = data['arcgis']['repository']['local_archives']
 
-    download_files(data, download_directory, username, password)
+    download_files(data, download_directory, username, password, args.connections)
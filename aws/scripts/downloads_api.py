@@ -1,4 +1,4 @@
-# Copyright 2024 Esri
+# Copyright 2024-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -18,6 +18,9 @@ import json
 import ssl
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 8
 
 
 class DownloadsAPIClient:
@@ -45,3 +48,25 @@ class DownloadsAPIClient:
             raise Exception(json_response['message'])
 
         return json_response['url']
+
+    # Generates URLs for downloading the files from the repository concurrently.
+    # files: list of (file, folder) tuples
+    # Returns dictionary that maps (file, folder) tuples to the URLs.
+    # Files for which the URL generation failed are not included in the dictionary.
+    def generate_urls(self, files: list, token: str, workers=DEFAULT_WORKERS):
+        urls = {}
+
+        if not files:
+            return urls
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.generate_url, file, folder, token): (file, folder)
+                       for file, folder in files}
+
+            for future, (file, folder) in futures.items():
+                try:
+                    urls[(file, folder)] = future.result()
+                except Exception as e:
+                    print("Failed to generate URL for '{0}': {1}".format(file, e))
+
+        return urls
@@ -1,4 +1,4 @@
-# Copyright 2024 Esri
+# Copyright 2024-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -13,29 +13,160 @@
 # limitations under the License.
 
 # Queries the Esri patch notification service for patches for a given set of products and versions.
+#
+# The patches catalog is cached on disk and revalidated using ETag and If-Modified-Since
+# conditional requests, so the catalog is downloaded only if it was changed.
+#
+# The patch sync watermark is the date of the last successful sync of patches for specific
+# patch notification settings. Patches released before the watermark minus WATERMARK_LOOKBACK_DAYS
+# are not requested again, because patches may be added to the catalog some time after their release date.
+
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
 
 import requests
 
+RELEASE_DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d', '%m/%d/%Y %H:%M:%S']
+WATERMARK_LOOKBACK_DAYS = 30
+
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'arcgis-gitops', 'patch_notification')
+
+
+# Returns the patch release date or None if the date is not specified or cannot be parsed.
+def release_date(patch):
+    value = patch.get('ReleaseDate')
+
+    if not value:
+        return None
+
+    for date_format in RELEASE_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+
+    return None
+
+
+# Returns the name of the repository index property with the patch sync watermark for the patch notification settings.
+def watermark_property(patch_notification: dict):
+    settings = {key: patch_notification.get(key) for key in ['url', 'products', 'versions', 'patches', 'subfolder']}
+    settings_hash = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+    return 'patches_watermark:' + settings_hash[:16]
+
+
+# Returns the release date since which the patches must be requested for the watermark in ISO format.
+def watermark_since(watermark: str):
+    if not watermark:
+        return None
+
+    return date.fromisoformat(watermark) - timedelta(days=WATERMARK_LOOKBACK_DAYS)
+
+
 class PatchNotification:
-    
-    def __init__(self, patches_url = 'https://downloads.esri.com/patch_notification/patches.json'):
+
+    def __init__(self, patches_url = 'https://downloads.esri.com/patch_notification/patches.json', cache_dir=None):
         self.patches_url = patches_url
+        self.cache_dir = cache_dir if cache_dir else default_cache_dir()
+        self._index = None
+
+    def _cache_paths(self):
+        name = hashlib.sha256(self.patches_url.encode('utf-8')).hexdigest()[:16]
+        return (os.path.join(self.cache_dir, name + '.json'),
+                os.path.join(self.cache_dir, name + '.meta.json'))
+
+    # Returns the patches catalog.
+    # The cached catalog is used if the service responds that the catalog was not modified.
+    def get_catalog(self):
+        catalog_path, meta_path = self._cache_paths()
+
+        headers = {}
+        meta = {}
+
+        if os.path.exists(catalog_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+            except Exception:
+                meta = {}
+
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = requests.get(self.patches_url, headers=headers)
+
+        if response.status_code == 304:
+            print("Patches catalog '{0}' is not modified. Using the cached catalog.".format(self.patches_url))
+            with open(catalog_path, 'r') as f:
+                return json.load(f)
+
+        response.raise_for_status()
+
+        catalog = response.json()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            with open(catalog_path, 'w') as f:
+                json.dump(catalog, f)
+
+            with open(meta_path, 'w') as f:
+                json.dump({
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }, f)
+        except OSError as e:
+            print("Failed to cache patches catalog: {0}".format(e))
+
+        return catalog
+
+    # Builds in-memory index of the catalog patches keyed by version and product.
+    # The patches in the index are stored as (position, patch) tuples to preserve the catalog order.
+    def _build_index(self):
+        index = {}
+        position = 0
+
+        for version_patches in self.get_catalog()['Product']:
+            products_index = index.setdefault(version_patches['version'], {})
+
+            for patch in version_patches['patches']:
+                products_index.setdefault(None, []).append((position, patch))
+
+                for product in patch['Products']:
+                    products_index.setdefault(product, []).append((position, patch))
+
+                position += 1
+
+        return index
 
     # Returns a list of patches for the given products and versions
     # products: list of products to get patches for
     # versions: list of versions to get patches for
-    def get_patches(self, products, versions):
-        response = requests.get(self.patches_url)
-        response.raise_for_status()
+    # since: if specified, only patches released on or after the date are returned
+    def get_patches(self, products, versions, since=None):
+        if self._index is None:
+            self._index = self._build_index()
+
+        selected = {}
+
+        for version in versions:
+            products_index = self._index.get(version, {})
+
+            for product in (products if products else [None]):
+                for position, patch in products_index.get(product, []):
+                    selected[position] = patch
 
-        all_patches = response.json()['Product']
+        patches = [selected[position] for position in sorted(selected)]
 
-        patches = []
-        for version_patches in all_patches:
-            if version_patches['version'] in versions:
-                for patch in version_patches['patches']:
-                    patch_products = patch['Products']
-                    if not products or any(product in patch_products for product in products):
-                        patches.append(patch)
+        if since:
+            patches = [patch for patch in patches
+                       if release_date(patch) is None or release_date(patch) >= since]
 
         return patches
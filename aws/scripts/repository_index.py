@@ -0,0 +1,145 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Index of the files in the repository S3 bucket.
+#
+# The index is a JSON object stored in the repository bucket that maps S3 keys of the files
+# copied to the bucket to their SHA-256 hashes, sizes, and source URLs:
+#
+# {
+#   "objects": {
+#     "software/arcgis/11.4/ArcGIS_Server_Linux_114_192977.tar.gz": {
+#       "sha256": "1b766ecdf0b16635f195ebd25151c4e2e7755197c743ae8d25790a07cb4e9b61",
+#       "size": 1369225012,
+#       "url": "https://downloads.arcgis.com/dms/rest/download/secured/ArcGIS_Server_Linux_114_192977.tar.gz"
+#     }
+#   },
+#   "properties": {
+#     "patches_watermark:4f1c9a8e2b7d6c5a": "2026-01-15"
+#   }
+# }
+#
+# The index properties store the repository state other than the objects, such as the patch sync watermarks.
+#
+# The index is loaded with a single GET request, which allows computing the list of the files
+# that must be copied without requesting metadata of each object in the bucket.
+
+import json
+import threading
+import urllib.parse
+
+INDEX_KEY = 'repository-index.json'
+
+
+class RepositoryIndex:
+
+    def __init__(self, s3_bucket, key=INDEX_KEY):
+        self.s3_bucket = s3_bucket
+        self.key = key
+        self.objects = {}
+        self.properties = {}
+        self._updates = {}
+        self._property_updates = {}
+        self._rebuild = False
+        self._lock = threading.Lock()
+
+    # Loads the index from the S3 bucket. If the index does not exist, the index is empty.
+    def load(self):
+        self.objects, self.properties = self._read()
+        print("Repository index '{0}' contains {1} objects.".format(self.key, len(self.objects)))
+
+    # Clears the index. The cleared index is not merged with the stored index on save.
+    def reset(self):
+        with self._lock:
+            self.objects = {}
+            self.properties = {}
+            self._rebuild = True
+
+    def _read(self):
+        s3_client = self.s3_bucket.meta.client
+
+        try:
+            body = s3_client.get_object(Bucket=self.s3_bucket.name, Key=self.key)['Body'].read()
+        except s3_client.exceptions.NoSuchKey:
+            return {}, {}
+
+        data = json.loads(body.decode('utf-8'))
+
+        return data.get('objects', {}), data.get('properties', {})
+
+    # Returns True if the index contains the key with the specified SHA-256 hash.
+    def is_current(self, key: str, sha256: str):
+        with self._lock:
+            entry = self.objects.get(key)
+            return sha256 is not None and entry is not None and entry.get('sha256') == sha256
+
+    def get(self, key: str):
+        with self._lock:
+            return self.objects.get(key)
+
+    # Records the object properties in the index.
+    # The query string is removed from the source URL, because it may contain access tokens.
+    def update(self, key: str, sha256: str, size=None, url=None):
+        if url:
+            url = urllib.parse.urlunsplit(urllib.parse.urlsplit(url)._replace(query='', fragment=''))
+
+        entry = {
+            'sha256': sha256,
+            'size': size,
+            'url': url
+        }
+
+        with self._lock:
+            self.objects[key] = entry
+            self._updates[key] = entry
+
+    def get_property(self, name: str, default=None):
+        with self._lock:
+            return self.properties.get(name, default)
+
+    def set_property(self, name: str, value):
+        with self._lock:
+            self.properties[name] = value
+            self._property_updates[name] = value
+
+    # Saves the index to the S3 bucket if it was updated.
+    # The updates are applied to the latest version of the index to preserve
+    # the updates made by other runs since the index was loaded.
+    def save(self):
+        with self._lock:
+            if not self._updates and not self._property_updates:
+                return
+
+            objects, properties = ({}, {}) if self._rebuild else self._read()
+            objects.update(self._updates)
+            properties.update(self._property_updates)
+
+            body = json.dumps({
+                'objects': objects,
+                'properties': properties
+            }, indent=1, sort_keys=True)
+
+            self.s3_bucket.meta.client.put_object(
+                Bucket=self.s3_bucket.name,
+                Key=self.key,
+                Body=body.encode('utf-8'),
+                ContentType='application/json')
+
+            self.objects = objects
+            self.properties = properties
+            self._updates = {}
+            self._property_updates = {}
+            self._rebuild = False
+
+            print("Repository index '{0}' saved with {1} objects.".format(self.key, len(objects)))
@@ -1,4 +1,4 @@
-# Copyright 2024 Esri
+# Copyright 2024-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -15,72 +15,328 @@
 # Copies files from local file system, public URLs, My Esri, and ArcGIS patch repositories to S3 bucket.
 
 import argparse
-import hashlib
 import json
 import os
 import sys
 import tempfile
-import urllib
+import time
+import urllib.request
 import fnmatch
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+import hash_utils
+import transfer_utils
+from transfer_tuning import TransferTuner, megabytes
+from repository_index import RepositoryIndex
 from downloads_api import DownloadsAPIClient
 from token_service_client import TokenServiceClient
-from patch_notification import PatchNotification
+from datetime import datetime, timezone
+from patch_notification import PatchNotification, watermark_property, watermark_since
 
-def s3_object_sha256(s3_bucket, s3_key):
+# Size of the parts uploaded to S3 in the streaming mode if the size of the streamed file is unknown.
+# Each concurrent transfer keeps one part in memory.
+# With 10000 parts limit of S3 multipart uploads, the maximum size of such files is 160 GB.
+STREAM_PART_SIZE = 16 * 1024 * 1024
+
+def object_key(filename: str, subfolder: str):
+    if subfolder is None:
+        return filename
+    else:
+        return "{0}/{1}".format(subfolder, filename)
+
+# Returns SHA-256 hash metadata and size of the S3 object.
+# S3 clients are thread safe, unlike the resources, so the bucket's client is used by the transfer workers.
+def s3_object_metadata(s3_bucket, s3_key):
     try:
-        sha256 = s3_bucket.Object(s3_key).metadata['sha256']
-        print("S3 object SHA256=" + sha256)   
-        return sha256.lower() if sha256 else None
+        response = s3_bucket.meta.client.head_object(Bucket=s3_bucket.name, Key=s3_key)
+        sha256 = response['Metadata']['sha256']
+        print("S3 object '{0}' SHA256={1}".format(s3_key, sha256))
+        return sha256.lower() if sha256 else None, response['ContentLength']
     except Exception as e:
+        return None, None
+
+# Checks if the S3 object with the specified SHA-256 hash exists.
+# Objects found by the check are added to the repository index.
+def s3_object_exists(s3_bucket, s3_key: str, sha256: str, url=None, index=None):
+    object_sha256, size = s3_object_metadata(s3_bucket, s3_key)
+
+    if object_sha256 is None or object_sha256 != sha256:
+        return False
+
+    if index is not None:
+        index.update(s3_key, sha256, size, url)
+
+    return True
+
+# Returns boto3 transfer configuration for the part size and number of threads.
+def transfer_config(part_size: int, concurrency: int):
+    return TransferConfig(multipart_threshold=part_size,
+                          multipart_chunksize=part_size,
+                          max_concurrency=concurrency,
+                          use_threads=concurrency > 1)
+
+# Reads up to size bytes from the stream.
+def read_part(stream, size: int):
+    buffer = bytearray()
+
+    while len(buffer) < size:
+        data = stream.read(size - len(buffer))
+        if not data:
+            break
+        buffer.extend(data)
+
+    return bytes(buffer)
+
+# Streams the data from the readable stream to the S3 object using multipart upload without storing it on local disk.
+# The SHA-256 hash is computed while the data is streamed, and the upload is aborted if the hash does not match.
+# size: size of the streamed data or None if the size is unknown
+# Returns Sha256Hasher with the hash and size of the streamed data.
+def stream_to_s3(stream, size, filename: str, s3_key: str, s3_bucket, sha256=None, tuner=None):
+    s3_client = s3_bucket.meta.client
+    tuner = tuner if tuner else TransferTuner()
+
+    extra_args = {'Metadata': {'sha256': sha256}} if sha256 else {}
+
+    upload_id = s3_client.create_multipart_upload(
+        Bucket=s3_bucket.name, Key=s3_key, **extra_args)['UploadId']
+
+    try:
+        hasher = hash_utils.Sha256Hasher()
+        parts = []
+        start = time.perf_counter()
+
+        part_size = tuner.part_size_for(size) if size else STREAM_PART_SIZE
+
+        while True:
+            data = read_part(stream, part_size)
+
+            if not data and parts:
+                break
+
+            hasher.update(data)
+
+            part_number = len(parts) + 1
+
+            etag = s3_client.upload_part(
+                Bucket=s3_bucket.name, Key=s3_key, UploadId=upload_id,
+                PartNumber=part_number, Body=data)['ETag']
+
+            parts.append({'PartNumber': part_number, 'ETag': etag})
+
+            if len(data) < part_size:
+                break
+
+        elapsed = time.perf_counter() - start
+
+        print("'{0}' streamed ({1:.1f} MB at {2:.1f} MB/s, {3} MB parts)".format(
+              filename, hasher.size / (1024 * 1024), hasher.size / (1024 * 1024) / elapsed if elapsed else 0.0,
+              part_size // (1024 * 1024)))
+
+        if sha256:
+            print(hasher.report(filename))
+            hasher.validate(filename, sha256)
+
+        s3_client.complete_multipart_upload(
+            Bucket=s3_bucket.name, Key=s3_key, UploadId=upload_id,
+            MultipartUpload={'Parts': parts})
+    except Exception:
+        print("Aborting upload of '{0}'...".format(s3_key))
+        s3_client.abort_multipart_upload(
+            Bucket=s3_bucket.name, Key=s3_key, UploadId=upload_id)
+        raise
+
+    return hasher
+
+# Streams the file from the URL to the S3 object.
+# Returns Sha256Hasher with the hash and size of the streamed file.
+def stream_file(url: str, filename: str, s3_key: str, s3_bucket, sha256=None, tuner=None):
+    print("Streaming '{0}' from '{1}' to '{2}'...".format(filename, url, s3_key))
+
+    with urllib.request.urlopen(url) as response:
+        content_length = response.headers.get('Content-Length')
+
+        return stream_to_s3(response, int(content_length) if content_length else None,
+                            filename, s3_key, s3_bucket, sha256, tuner)
+
+# Returns the source repository for the replication mode.
+# source: S3 bucket name or Azure Blob Storage container URL
+def source_repository(source: str):
+    if source.startswith('https://'):
+        try:
+            from azure.identity import DefaultAzureCredential
+            from azure.storage.blob import ContainerClient
+        except ImportError:
+            raise Exception("azure-storage-blob and azure-identity packages are required to replicate files from Azure Blob Storage.")
+
+        return ContainerClient.from_container_url(source, credential=DefaultAzureCredential())
+
+    if source.startswith('s3://'):
+        source = source[len('s3://'):]
+
+    return boto3.resource('s3').Bucket(source.strip('/'))
+
+def is_azure_container(source):
+    return hasattr(source, 'container_name')
+
+# Returns SHA-256 hash metadata and size of the file in the source repository.
+def source_metadata(source, key: str):
+    if not is_azure_container(source):
+        return s3_object_metadata(source, key)
+
+    try:
+        properties = source.get_blob_client(key).get_blob_properties()
+        sha256 = properties.metadata.get('sha256')
+        return sha256.lower() if sha256 else None, properties.size
+    except Exception:
+        return None, None
+
+# Copies the file from the source repository to the S3 bucket.
+# Files in S3 source buckets are copied using server-side copy, files in Azure Blob Storage are streamed to S3.
+# The file is copied only if the source object has SHA-256 hash metadata that matches the expected hash.
+# Returns COPIED or SKIPPED if the file was replicated, or None if the file must be copied from the original location.
+def replicate_file(source, filename: str, subfolder: str, s3_bucket, sha256=None, index=None, tuner=None):
+    s3_key = object_key(filename, subfolder)
+    tuner = tuner if tuner else TransferTuner()
+
+    if sha256 and s3_object_exists(s3_bucket, s3_key, sha256, None, index):
+        print("Object '{0}' already exists in the S3 bucket.".format(s3_key))
+        return transfer_utils.SKIPPED
+
+    source_sha256, size = source_metadata(source, s3_key)
+
+    if source_sha256 is None:
+        print("Object '{0}' with SHA-256 metadata is not found in the source repository.".format(s3_key))
         return None
-    
-def copy_file(url: str, path: str, filename: str, subfolder: str, s3_bucket, sha256=None):
-    if subfolder is None:
-        s3_key = filename        
+
+    if sha256 and source_sha256 != sha256:
+        print("SHA-256 hash of '{0}' in the source repository does not match the expected hash.".format(s3_key))
+        return None
+
+    if not sha256 and s3_object_exists(s3_bucket, s3_key, source_sha256, None, index):
+        print("Object '{0}' already exists in the S3 bucket.".format(s3_key))
+        return transfer_utils.SKIPPED
+
+    if is_azure_container(source):
+        source_url = source.get_blob_client(s3_key).url
+
+        print("Streaming '{0}' from '{1}' to '{2}'...".format(filename, source_url, s3_key))
+
+        downloader = source.get_blob_client(s3_key).download_blob(max_concurrency=tuner.settings(size)[1])
+        stream_to_s3(downloader, size, filename, s3_key, s3_bucket, source_sha256, tuner)
     else:
-        s3_key = "{0}/{1}".format(subfolder, filename)
+        source_url = "s3://{0}/{1}".format(source.name, s3_key)
+
+        print("Copying '{0}' from '{1}' to '{2}'...".format(filename, source_url, s3_key))
+
+        # The metadata is specified explicitly because multipart copies do not copy the source object metadata.
+        tuner.upload(filename, size,
+                     lambda part_size, concurrency: s3_bucket.meta.client.copy(
+                         {'Bucket': source.name, 'Key': s3_key}, s3_bucket.name, s3_key,
+                         ExtraArgs={'Metadata': {'sha256': source_sha256}, 'MetadataDirective': 'REPLACE'},
+                         SourceClient=source.meta.client,
+                         Config=transfer_config(part_size, concurrency)),
+                     'copied')
+
+    if index is not None:
+        index.update(s3_key, source_sha256, size, source_url)
+
+    print("File '{0}' replicated.".format(filename))
 
-    filepath = os.path.join(tempfile.gettempdir(), filename)
+    return transfer_utils.COPIED
+
+def copy_file(url: str, path: str, filename: str, subfolder: str, s3_bucket, sha256=None, stream=False, index=None, tuner=None):
+    s3_key = object_key(filename, subfolder)
+    tuner = tuner if tuner else TransferTuner()
+
+    if sha256 and s3_object_exists(s3_bucket, s3_key, sha256, url, index):
+        print("Object '{0}' already exists in the S3 bucket.".format(s3_key))
+        return transfer_utils.SKIPPED
+
+    if stream and not path:
+        hasher = stream_file(url, filename, s3_key, s3_bucket, sha256, tuner)
+
+        if sha256 and index is not None:
+            index.update(s3_key, sha256, hasher.size, url)
+
+        print("File '{0}' copied.".format(filename))
+
+        return transfer_utils.COPIED
+
+    # Each transfer uses its own temporary directory to let concurrent transfers download files with the same name.
+    download_dir = tempfile.mkdtemp()
+    filepath = os.path.join(download_dir, filename)
     
     try:
-        if sha256 and sha256 == s3_object_sha256(s3_bucket, s3_key):
-            print("Object '{0}' already exists in the S3 bucket.".format(s3_key))
-            return
+        hasher = None
 
         if path:
             filepath = path
         else:
             print("Downloading '{0}' from '{1}'...".format(filename, url))
-            urllib.request.urlretrieve(url, filepath)
+            hasher = hash_utils.download_url(url, filepath)
 
         extra_args = {}
 
         if sha256:
-            print("Validating SHA256 hash...")
-            
-            with open(filepath, 'rb') as f:
-                sha256_hash = hashlib.sha256()
-                sha256_hash.update(f.read())
-                print("SHA-256=" + sha256_hash.hexdigest())
-                if sha256_hash.hexdigest().lower() != sha256:
-                    raise Exception(
-                        "SHA-256 hash validation of '{0}' failed.".format(filename))
+            print("Validating SHA256 hash of '{0}'...".format(filename))
+
+            if hasher is None:
+                hasher = hash_utils.file_sha256(filepath)
+
+            print(hasher.report(filename))
+            hasher.validate(filename, sha256)
             
             extra_args = {'Metadata': {'sha256': sha256}}
-        
 
         print("Uploading '{0}' to '{1}'...".format(filename, s3_key))
 
-        s3_bucket.upload_file(filepath, s3_key, ExtraArgs=extra_args)
+        tuner.upload(filename, os.path.getsize(filepath),
+                     lambda part_size, concurrency: s3_bucket.meta.client.upload_file(
+                         filepath, s3_bucket.name, s3_key, ExtraArgs=extra_args,
+                         Config=transfer_config(part_size, concurrency)))
+
+        if sha256 and index is not None:
+            index.update(s3_key, sha256, os.path.getsize(filepath), url or path)
 
         print("File '{0}' copied.".format(filename))
+
+        return transfer_utils.COPIED
     finally:
-        if not path and os.path.exists(filepath):
+        if os.path.exists(filepath) and not path:
             os.remove(filepath)
+        os.rmdir(download_dir)
+
+# Returns a transfer job that copies the file to the S3 bucket.
+# If url_generator is specified, the job generates a new URL for retries and
+# if the URL is not specified.
+# If source repository is specified, the job replicates the file from the source repository,
+# and copies it from the URL only if the file is not available in the source repository.
+def copy_file_job(url: str, path: str, filename: str, subfolder: str, s3_bucket, sha256=None, url_generator=None, stream=False, index=None, tuner=None, source=None):
+    attempts = 0
+
+    def job():
+        nonlocal attempts
+
+        if source is not None and not path:
+            status = replicate_file(source, filename, subfolder, s3_bucket, sha256, index, tuner)
 
-def copy_files(data, s3_bucket, username, password):
+            if status:
+                return status
+
+        file_url = url
+
+        if not path and url_generator and (not file_url or attempts > 0):
+            # Generate Downloads API URL
+            file_url = url_generator()
+
+        attempts += 1
+
+        return copy_file(file_url, path, filename, subfolder, s3_bucket, sha256, stream, index, tuner)
+
+    return job
+
+def copy_files(data, s3_bucket, username, password, workers=transfer_utils.DEFAULT_WORKERS, retries=transfer_utils.DEFAULT_RETRIES, stream=False, index=None, tuner=None, source=None):
     if 'server' in data['arcgis']['repository']:
         downloads_api = DownloadsAPIClient(
             data['arcgis']['repository']['server']['url'])
@@ -92,30 +348,61 @@ def copy_files(data, s3_bucket, username, password):
 
     files = data['arcgis']['repository']['files']
 
+    planned_files = []
+    current_files = []
+
     for filename, props in files.items():
         subfolder = props['subfolder'] if 'subfolder' in props else None
         sha256 = props['sha256'].lower() if 'sha256' in props else None
         path = props['path'] if 'path' in props else None
         url = props['url'] if 'url' in props else None
 
-        if not path and not url:
-            # Generate Downloads API URL
-            token = token_service.generate_token(username, password)
-            url = downloads_api.generate_url(filename, subfolder, token)
+        if index is not None and index.is_current(object_key(filename, subfolder), sha256):
+            current_files.append(filename)
+            continue
 
+        planned_files.append((filename, subfolder, sha256, path, url))
+
+    print("{0} files are up to date in the repository index, {1} files to copy.".format(len(current_files), len(planned_files)))
+
+    # Generate Downloads API URLs for the files copied from My Esri repository concurrently
+    my_esri_files = [(filename, subfolder) for filename, subfolder, sha256, path, url in planned_files
+                     if not path and not url]
+    
+    my_esri_urls = {}
+
+    # In the replication mode the URLs are generated only for the files not found in the source repository
+    if my_esri_files and source is None:
         try:
-            copy_file(url, path, filename, subfolder, s3_bucket, sha256)
-        except Exception as e1:
-            print(e1)
-            print("Retrying copy of '{0}'...".format(filename))
+            token = token_service.get_token(username, password)
+            my_esri_urls = downloads_api.generate_urls(my_esri_files, token)
+        except Exception as e:
+            print("Failed to generate Downloads API URLs: {0}".format(e))
+
+    jobs = []
+
+    for filename, subfolder, sha256, path, url in planned_files:
+        url_generator = None
 
-            try:
-                copy_file(url, path, filename, subfolder, s3_bucket, sha256)
-            except Exception as e2:
-                print(e2)
-                sys.exit(1)
+        if not path and not url:
+            url = my_esri_urls.get((filename, subfolder))
+
+            def generate_url(filename=filename, subfolder=subfolder):
+                token = token_service.get_token(username, password)
+                return downloads_api.generate_url(filename, subfolder, token)
+
+            url_generator = generate_url
+
+        jobs.append((filename, copy_file_job(url, path, filename, subfolder, s3_bucket, sha256, url_generator, stream, index, tuner, source)))
+
+    summary = transfer_utils.run_transfers(jobs, workers, retries)
+
+    for filename in current_files:
+        summary.add(filename, transfer_utils.SKIPPED)
+
+    print("{0} files processed.".format(len(files)))
 
-    print("{0} files copied.".format(len(files)))
+    return summary
 
 def matches_pattern(filename, patterns):
     for pattern in patterns:
@@ -124,9 +411,9 @@ def matches_pattern(filename, patterns):
     return False
 
 # 
-def copy_patches(data, s3_bucket):
+def copy_patches(data, s3_bucket, workers=transfer_utils.DEFAULT_WORKERS, retries=transfer_utils.DEFAULT_RETRIES, stream=False, index=None, tuner=None, source=None):
     if 'patch_notification' not in data['arcgis']['repository']:
-        return
+        return transfer_utils.TransferSummary()
     
     patch_notification = data['arcgis']['repository']['patch_notification']
 
@@ -138,10 +425,25 @@ def copy_patches(data, s3_bucket):
     else:
         patches_repository = PatchNotification()
 
+    # Request only the patches released since the last successful sync
+    watermark = None
+    since = None
+
+    if index is not None:
+        watermark = watermark_property(patch_notification)
+        since = watermark_since(index.get_property(watermark))
+
+    sync_date = datetime.now(timezone.utc).date()
+
     patches = patches_repository.get_patches(patch_notification['products'], 
-                                             patch_notification['versions'])
+                                             patch_notification['versions'],
+                                             since)
+
+    if since:
+        print("{0} patches released since {1}.".format(len(patches), since.isoformat()))
 
-    patches_processed = 0
+    jobs = []
+    current_patches = []
 
     for patch in patches:
         print("Processing patch '{0}'...".format(patch['Name']))
@@ -158,12 +460,24 @@ def copy_patches(data, s3_bucket):
                 continue
 
             sha256 = patch_sha[filename].lower() if filename in patch_sha else None
-           
-            copy_file(url, None, filename, subfolder, s3_bucket, sha256)
 
-            patches_processed += 1
+            if index is not None and index.is_current(object_key(filename, subfolder), sha256):
+                current_patches.append(filename)
+                continue
+
+            jobs.append((filename, copy_file_job(url, None, filename, subfolder, s3_bucket, sha256, stream=stream, index=index, tuner=tuner, source=source)))
+
+    summary = transfer_utils.run_transfers(jobs, workers, retries)
 
-    print("{0} patches copied.".format(patches_processed))
+    for filename in current_patches:
+        summary.add(filename, transfer_utils.SKIPPED)
+
+    print("{0} patches processed.".format(len(jobs) + len(current_patches)))
+
+    if watermark and summary.succeeded():
+        index.set_property(watermark, sync_date.isoformat())
+
+    return summary
 
 
 if __name__ == '__main__':
@@ -179,6 +493,22 @@ if __name__ == '__main__':
                         help='My Esri user password')
     parser.add_argument('-f', dest='files', required=True,
                         help='Index JSON file path')
+    parser.add_argument('-w', dest='workers', required=False, type=int,
+                        default=transfer_utils.DEFAULT_WORKERS,
+                        help='Number of files copied concurrently')
+    parser.add_argument('-r', dest='retries', required=False, type=int,
+                        default=transfer_utils.DEFAULT_RETRIES,
+                        help='Number of retries of failed file copies')
+    parser.add_argument('-s', dest='stream', required=False, action='store_true',
+                        help='Stream downloaded files to S3 without storing them on local disk')
+    parser.add_argument('-i', dest='rebuild_index', required=False, action='store_true',
+                        help='Rebuild the repository index by checking metadata of each S3 object')
+    parser.add_argument('-m', dest='part_size', required=False, type=megabytes,
+                        help='Multipart upload part size in MB (selected based on the file size by default)')
+    parser.add_argument('-t', dest='max_concurrency', required=False, type=int,
+                        help='Maximum number of threads used to upload a single file')
+    parser.add_argument('-o', dest='source', required=False,
+                        help='Source repository S3 bucket name or Azure Blob Storage container URL to replicate files from')
 
     args = parser.parse_args()
 
@@ -210,6 +540,29 @@ if __name__ == '__main__':
 
     print("Copying files to '{0}' S3 bucket...".format(args.bucket_name))
 
-    copy_files(data, s3_bucket, username, password)
+    index = RepositoryIndex(s3_bucket)
+
+    # The tuner is shared by all the transfers to estimate the upload throughput
+    tuner = TransferTuner(args.part_size, args.max_concurrency)
+
+    source = source_repository(args.source) if args.source else None
+
+    if source is not None:
+        print("Replicating files from '{0}' repository...".format(args.source))
+
+    if args.rebuild_index:
+        index.reset()
+    else:
+        index.load()
+
+    try:
+        summary = copy_files(data, s3_bucket, username, password, args.workers, args.retries, args.stream, index, tuner, source)
+
+        summary.merge(copy_patches(data, s3_bucket, args.workers, args.retries, args.stream, index, tuner, source))
+    finally:
+        index.save()
+
+    summary.print()
 
-    copy_patches(data, s3_bucket)
+    if not summary.succeeded():
+        sys.exit(1)
@@ -66,7 +66,9 @@ if __name__ == '__main__':
         'Values': args.machine_roles.split(',')
     }]
 
-    if not ssm_utils.wait_for_target_instances(ec2_client, ssm_client, ec2_filters, ssm_filters, WAIT_TIMEOUT):
+    instance_ids = ssm_utils.wait_for_target_instances(ec2_client, ssm_client, ec2_filters, ssm_filters, WAIT_TIMEOUT)
+
+    if not instance_ids:
         exit(1)
 
     command_id = ssm_client.send_command(
@@ -79,7 +81,8 @@ if __name__ == '__main__':
         OutputS3KeyPrefix=args.deployment_id
     )['Command']['CommandId']
 
-    status = ssm_utils.wait_for_command_invocations(ssm_client, command_id, EXECUTION_TIMEOUT)
+    status = ssm_utils.wait_for_command_invocations(ssm_client, command_id, EXECUTION_TIMEOUT,
+                                                    instance_ids=instance_ids)
 
     ssm_utils.print_command_output(s3_client, args.deployment_id, command_id, args.s3_bucket)
 
@@ -19,15 +19,59 @@
 # To execute Chef Client the script runs <enterprise id>-run-chef SSM command on EC2 instances of the deployment
 # in the specified machine roles, waits for all the command invocations to complete, 
 # retrieves from S3 and prints outputs of the command invocations.
+#
+# If machine role dependencies are specified, the SSM command is run separately for each machine role.
+# The roles that do not depend on other roles run concurrently, and each dependent role runs as soon as
+# the roles it depends on succeeded. Maximum concurrency and maximum errors of the SSM commands can be
+# specified to run rolling updates.
+#
+# The hash of the JSON attributes and the cookbooks version of the last successful Chef run is recorded
+# in ArcGISChefRunHash:<json attributes parameter> tag of each instance. If -u argument is specified,
+# Chef run is skipped on the instances where the last successful Chef run used the same attributes
+# and cookbooks. By default, Chef runs on all the target instances.
+# The cookbooks version defaults to the value of /arcgis/<enterprise id>/cookbooks-url SSM parameter.
+# If the cookbooks archive is in S3, ETag of the archive is included in the version. For HTTP URLs,
+# only the URL is included, so republishing the archive at the same HTTP URL is not detected.
+#
+# JSON attributes larger than 4 KB are not put into the SSM parameter. Instead, the attributes are compressed
+# and uploaded to a new SSE-KMS encrypted S3 object in the output S3 bucket. The run-chef command downloads
+# the object and verifies SHA-256 hash of the attributes. The object is deleted when the script completes,
+# the same way as the SSM parameter, so the attributes do not persist in S3 and are uploaded by each run.
 
 import os
 import base64
 import argparse
+from functools import partial
 import boto3
 import ssm_utils
 
 WAIT_TIMEOUT = 600
-SEND_TIMEOUT = 600 # seconds
+
+
+# Parses role dependencies specified as 'role:dependency+dependency,role:dependency' string.
+# Dependencies on the roles that are not in machine_roles are ignored.
+# Returns dictionary of role -> list of roles it depends on.
+def parse_role_dependencies(role_dependencies, machine_roles):
+    dependencies = {}
+
+    for item in role_dependencies.split(','):
+        if not item.strip():
+            continue
+
+        role, _, depends_on = item.partition(':')
+        dependencies[role.strip()] = [d.strip() for d in depends_on.split('+') if d.strip() in machine_roles]
+
+    return dependencies
+
+
+# Returns the cookbooks URL from /arcgis/<enterprise id>/cookbooks-url SSM parameter,
+# or an empty string if the parameter does not exist.
+def get_cookbooks_url(ssm_client, enterprise_id):
+    try:
+        return ssm_client.get_parameter(Name='/arcgis/{0}/cookbooks-url'.format(enterprise_id))['Parameter']['Value']
+    except ssm_client.exceptions.ParameterNotFound:
+        return ''
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -40,9 +84,23 @@ if __name__ == '__main__':
     parser.add_argument('-j', dest='json_attributes_parameter', help='SSM parameter name of role attributes')
     parser.add_argument('-b', dest='s3_bucket', help='Output S3 bucket')
     parser.add_argument('-e', dest='execution_timeout', help='Execution timeout (seconds)')
+    parser.add_argument('-r', dest='role_dependencies', default='', help='Machine role dependencies, such as node:primary,standby:primary')
+    parser.add_argument('-c', dest='max_concurrency', default=None, help='Maximum number or percentage of instances that run Chef concurrently')
+    parser.add_argument('-x', dest='max_errors', default=None, help='Maximum number or percentage of failed Chef runs')
+    parser.add_argument('-k', dest='cookbooks_version', default=None, help='Chef cookbooks version or URL')
+    parser.add_argument('-u', dest='skip_converged', action='store_true', help='Skip Chef run on the instances converged with the same attributes and cookbooks')
 
     args = parser.parse_args()
 
+    machine_roles = args.machine_roles.split(',')
+    dependencies = parse_role_dependencies(args.role_dependencies, machine_roles)
+
+    try:
+        ssm_utils.validate_dependencies({role: dependencies.get(role, []) for role in machine_roles})
+    except ValueError as e:
+        print("Invalid machine role dependencies. {0}".format(e))
+        exit(1)
+
     ec2_client = boto3.client('ec2')
     ssm_client = boto3.client('ssm')
     s3_client = boto3.client('s3')
@@ -72,13 +130,59 @@ if __name__ == '__main__':
         'Values': args.machine_roles.split(',')
     }]
 
-    if not ssm_utils.wait_for_target_instances(ec2_client, ssm_client, ec2_filters, ssm_filters, WAIT_TIMEOUT):
+    instance_ids = ssm_utils.wait_for_target_instances(ec2_client, ssm_client, ec2_filters, ssm_filters, WAIT_TIMEOUT)
+
+    if not instance_ids:
         exit(1)
 
-    # Put JSON attributes to SSM parameter if JSON_ATTRIBUTES env variable is defined
+    instance_tags = ssm_utils.describe_instance_tags(ec2_client, instance_ids)
+
+    # The run hash is known only if the JSON attributes are passed by JSON_ATTRIBUTES env variable.
+    run_hash = None
+    converged_ids = []
+
     if 'JSON_ATTRIBUTES' in os.environ:
         jsonAttributes = base64.b64decode(os.environ['JSON_ATTRIBUTES']).decode('utf-8')
-    
+
+        cookbooks_version = args.cookbooks_version
+        if cookbooks_version is None:
+            cookbooks_version = get_cookbooks_url(ssm_client, args.enterprise_id)
+
+        run_hash = ssm_utils.chef_run_hash(jsonAttributes, ssm_utils.cookbooks_version(s3_client, cookbooks_version))
+        hash_tag = ssm_utils.chef_run_hash_tag(args.json_attributes_parameter)
+
+        if args.skip_converged:
+            converged_ids = [i for i in instance_ids if instance_tags[i].get(hash_tag) == run_hash]
+
+    if converged_ids:
+        print("Skipping Chef run on {0} of {1} instances converged with the same attributes and cookbooks: {2}".format(
+              len(converged_ids), len(instance_ids), ', '.join(converged_ids)))
+
+    pending_ids = [i for i in instance_ids if i not in converged_ids]
+
+    if not pending_ids:
+        print("All the target instances are converged.")
+        exit(0)
+
+    document_parameters = {
+        'JsonAttributes': [args.json_attributes_parameter],
+        'ExecutionTimeout': [args.execution_timeout]
+    }
+
+    # Large JSON attributes are passed through S3 instead of SSM parameter.
+    s3_payload = 'JSON_ATTRIBUTES' in os.environ and \
+        len(jsonAttributes.encode('utf-8')) > ssm_utils.PAYLOAD_SIZE_THRESHOLD
+
+    if s3_payload:
+        payload_url, payload_sha256 = ssm_utils.put_s3_payload(s3_client, args.s3_bucket, args.deployment_id,
+                                                               jsonAttributes)
+        document_parameters = {
+            'JsonAttributesUrl': [payload_url],
+            'JsonAttributesSha256': [payload_sha256],
+            'ExecutionTimeout': [args.execution_timeout]
+        }
+    elif 'JSON_ATTRIBUTES' in os.environ:
+        # Put JSON attributes to SSM parameter if JSON_ATTRIBUTES env variable is defined
         print("Creating SecureString SSM parameter {0}...".format(args.json_attributes_parameter))
 
         ssm_client.put_parameter(
@@ -95,27 +199,70 @@ if __name__ == '__main__':
             Tier='Intelligent-Tiering'
         )
 
-    command_id = ssm_client.send_command(
-        Targets=ssm_filters,
-        DocumentName=args.enterprise_id + '-run-chef',
-        TimeoutSeconds=SEND_TIMEOUT,
-        Comment='Runs Chef client with a specific role JSON file.',
-        Parameters={
-            'JsonAttributes': [args.json_attributes_parameter],
-            'ExecutionTimeout': [args.execution_timeout]
-        },    
-        OutputS3BucketName=args.s3_bucket,
-        OutputS3KeyPrefix=args.deployment_id
-    )['Command']['CommandId']
+    succeeded_ids = []
+    failed_ids = []
+
+    def on_complete(instance_id, status):
+        (succeeded_ids if status == 'Success' else failed_ids).append(instance_id)
+
+    def send_run_chef(roles, batch_instance_ids, target_instance_ids):
+        return ssm_utils.run_command(
+            ssm_client, s3_client, args.enterprise_id, args.deployment_id, roles,
+            args.enterprise_id + '-run-chef',
+            document_parameters,
+            'Runs Chef client with a specific role JSON file.',
+            int(args.execution_timeout),
+            args.s3_bucket,
+            batch_instance_ids,
+            args.max_concurrency,
+            args.max_errors,
+            target_instance_ids,
+            on_complete)
+
+    # If some instances are converged, the command targets the other instances by their IDs in batches.
+    def run_chef(roles, role_instance_ids):
+        if not role_instance_ids:
+            with ssm_utils.OUTPUT_LOCK:
+                print("Chef run on '{0}' machines is not required.".format(','.join(roles)))
+            return 'Success'
+
+        if not converged_ids:
+            return send_run_chef(roles, role_instance_ids, False)
+
+        statuses = [send_run_chef(roles, role_instance_ids[i:i + ssm_utils.INSTANCE_IDS_BATCH_SIZE], True)
+                    for i in range(0, len(role_instance_ids), ssm_utils.INSTANCE_IDS_BATCH_SIZE)]
+
+        return 'Success' if all(s == 'Success' for s in statuses) else 'Failed'
+
+    if dependencies:
+        tasks = {
+            role: (dependencies.get(role, []),
+                   partial(run_chef, [role],
+                           [i for i in pending_ids if instance_tags[i].get('ArcGISMachineRole') == role]))
+            for role in machine_roles
+        }
+    else:
+        tasks = {args.machine_roles: ([], partial(run_chef, machine_roles, pending_ids))}
+
+    # Delete the JSON attributes from S3 or the SSM parameter even if the Chef run fails or is interrupted.
+    try:
+        statuses = ssm_utils.run_tasks(tasks)
+
+        for name in tasks:
+            print("Chef run on '{0}' machines: {1}".format(name, statuses[name]))
 
-    status = ssm_utils.wait_for_command_invocations(ssm_client, command_id, int(args.execution_timeout))
+        status = 'Success' if all(s == 'Success' for s in statuses.values()) else 'Failed'
 
-    print("Deleting SecureString SSM parameter {0}...".format(args.json_attributes_parameter))
-    
-    ssm_client.delete_parameter(
-        Name=args.json_attributes_parameter
-    )
+        if run_hash is not None:
+            ssm_utils.update_chef_run_hash(ec2_client, hash_tag, run_hash, succeeded_ids, failed_ids)
+    finally:
+        if s3_payload:
+            ssm_utils.delete_s3_payload(s3_client, payload_url)
+        else:
+            print("Deleting SecureString SSM parameter {0}...".format(args.json_attributes_parameter))
 
-    ssm_utils.print_command_output(s3_client, args.deployment_id, command_id, args.s3_bucket)
+            ssm_client.delete_parameter(
+                Name=args.json_attributes_parameter
+            )
 
     exit(0 if status == 'Success' else 1)
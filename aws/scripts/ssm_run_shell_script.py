@@ -20,6 +20,12 @@
 # To execute the shell script it runs AWS-RunShellScript SSM command on EC2 instances of the deployment
 # in the specified machine roles, waits for all the command invocations to complete, 
 # retrieves from S3 and prints outputs of the command invocations.
+#
+# Script input parameters larger than 4 KB are not put into the SSM parameter. Instead, the parameters
+# are compressed and uploaded to a new SSE-KMS encrypted S3 object in the output S3 bucket. Commands that
+# download the object, verify SHA-256 hash of the parameters, and save the parameters to a temporary file
+# are added to the beginning of the script, and the file path is exported in JSON_ATTRIBUTES_FILE
+# environment variable. The object is deleted when the script completes, the same way as the SSM parameter.
 
 import os
 import base64
@@ -30,6 +36,23 @@ import ssm_utils
 WAIT_TIMEOUT = 600
 SEND_TIMEOUT = 600 # seconds
 
+
+# Returns shell commands that download the S3 payload to a temporary file, verify SHA-256 hash
+# of the payload, and export the file path in JSON_ATTRIBUTES_FILE environment variable.
+def s3_payload_commands(payload_url, payload_sha256):
+    return [
+        'export JSON_ATTRIBUTES_FILE=$(mktemp)',
+        "trap 'rm -f $JSON_ATTRIBUTES_FILE' EXIT",
+        "if ! aws s3 cp '{0}' $JSON_ATTRIBUTES_FILE.gz --only-show-errors || ! gunzip -f $JSON_ATTRIBUTES_FILE.gz; then".format(payload_url),
+        "  echo \"Error: Failed to retrieve '{0}' payload.\"".format(payload_url),
+        '  exit 1',
+        'fi',
+        "if ! echo \"{0}  $JSON_ATTRIBUTES_FILE\" | sha256sum -c --status; then".format(payload_sha256),
+        "  echo \"Error: SHA-256 hash of '{0}' payload does not match.\"".format(payload_url),
+        '  exit 1',
+        'fi'
+    ]
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         prog='ssm_run_shell_script.py',
@@ -83,13 +106,28 @@ if __name__ == '__main__':
         'Values': args.machine_roles.split(',')
     }]
 
-    if not ssm_utils.wait_for_target_instances(ec2_client, ssm_client, ec2_filters, ssm_filters, WAIT_TIMEOUT):
+    instance_ids = ssm_utils.wait_for_target_instances(ec2_client, ssm_client, ec2_filters, ssm_filters, WAIT_TIMEOUT)
+
+    if not instance_ids:
         exit(1)
 
+    s3_payload = False
+
     # Put JSON attributes to SSM parameter if JSON_ATTRIBUTES env variable is defined
     if 'JSON_ATTRIBUTES' in os.environ and args.json_attributes_parameter:
         jsonAttributes = base64.b64decode(os.environ['JSON_ATTRIBUTES']).decode('utf-8')
-    
+
+        # Large JSON attributes are passed through S3 instead of SSM parameter.
+        s3_payload = len(jsonAttributes.encode('utf-8')) > ssm_utils.PAYLOAD_SIZE_THRESHOLD
+
+    if s3_payload:
+        payload_url, payload_sha256 = ssm_utils.put_s3_payload(s3_client, args.s3_bucket, args.deployment_id,
+                                                               jsonAttributes)
+
+        # Keep the interpreter directive in the first line of the script.
+        position = 1 if commands and commands[0].startswith('#!') else 0
+        commands[position:position] = s3_payload_commands(payload_url, payload_sha256)
+    elif 'JSON_ATTRIBUTES' in os.environ and args.json_attributes_parameter:
         print("Creating SecureString SSM parameter {0}...".format(args.json_attributes_parameter))
 
         ssm_client.put_parameter(
@@ -106,28 +144,38 @@ if __name__ == '__main__':
             Tier='Intelligent-Tiering'
         )
 
-    command_id = ssm_client.send_command(
-        Targets=ssm_filters,
-        DocumentName='AWS-RunShellScript',
-        TimeoutSeconds=SEND_TIMEOUT,
-        Comment='Runs shell script.',
-        Parameters={
-            'commands': commands,
-            # 'workingDirectory': '',
-            'executionTimeout': [args.execution_timeout]
-        },    
-        OutputS3BucketName=args.s3_bucket,
-        OutputS3KeyPrefix=args.deployment_id
-    )['Command']['CommandId']
-
-    status = ssm_utils.wait_for_command_invocations(ssm_client, command_id, int(args.execution_timeout))
-
-    print("Deleting SecureString SSM parameter {0}...".format(args.json_attributes_parameter))
-    
-    ssm_client.delete_parameter(
-        Name=args.json_attributes_parameter
-    )
-
-    ssm_utils.print_command_output(s3_client, args.deployment_id, command_id, args.s3_bucket)
+    # Delete the parameters from S3 or the SSM parameter even if the command fails or is interrupted.
+    try:
+        command_id = ssm_client.send_command(
+            Targets=ssm_filters,
+            DocumentName='AWS-RunShellScript',
+            TimeoutSeconds=SEND_TIMEOUT,
+            Comment='Runs shell script.',
+            Parameters={
+                'commands': commands,
+                # 'workingDirectory': '',
+                'executionTimeout': [args.execution_timeout]
+            },    
+            OutputS3BucketName=args.s3_bucket,
+            OutputS3KeyPrefix=args.deployment_id
+        )['Command']['CommandId']
+
+        # Print the output of each instance as soon as the invocation on the instance completes.
+        output_printer = ssm_utils.CommandOutputPrinter(s3_client, args.deployment_id, command_id, args.s3_bucket)
+
+        status = ssm_utils.wait_for_command_invocations(ssm_client, command_id, int(args.execution_timeout),
+                                                        on_complete=output_printer.on_complete,
+                                                        instance_ids=instance_ids)
+    finally:
+        if s3_payload:
+            ssm_utils.delete_s3_payload(s3_client, payload_url)
+        elif args.json_attributes_parameter:
+            print("Deleting SecureString SSM parameter {0}...".format(args.json_attributes_parameter))
+
+            ssm_client.delete_parameter(
+                Name=args.json_attributes_parameter
+            )
+
+    output_printer.finish()
 
     exit(0 if status == 'Success' else 1)
@@ -1,4 +1,4 @@
-# Copyright 2024 Esri
+# Copyright 2024-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -14,87 +14,644 @@
 
 # Helper functions used by scripts that run SSM commands.
 
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from time import sleep
 import boto3
 
 SLEEP_TIME = 10
 
-# Wait until the target EC2 instances status is online
-def wait_for_target_instances(ec2_client, ssm_client, ec2_filters, ssm_filters, wait_timeout):
-    for i in range(wait_timeout // SLEEP_TIME):
-        ec2_reservations = ec2_client.describe_instances(
-            Filters=ec2_filters
-        )['Reservations']
-
-        ssm_instances = ssm_client.describe_instance_information(
-            Filters=ssm_filters
-        )['InstanceInformationList']
-        
-        if len(ssm_instances) > 0:
-            ec2_instance_count = 0
-            
-            for reservation in ec2_reservations:
-                ec2_instance_count += len(reservation['Instances'])
-            
-            online_instance_count = 0
-            
-            for instance in ssm_instances:
+# Time in seconds for a command to start running on the target instances
+SEND_TIMEOUT = 600
+
+# Command invocations are polled starting from MIN_POLL_INTERVAL seconds.
+# The interval grows by POLL_BACKOFF factor while the invocations status does not change
+# up to MAX_POLL_INTERVAL seconds and returns to the minimum when an invocation completes.
+MIN_POLL_INTERVAL = 1 # seconds
+MAX_POLL_INTERVAL = 10 # seconds
+POLL_BACKOFF = 1.5
+POLL_JITTER = 0.2
+
+# Number of command output objects downloaded concurrently
+OUTPUT_WORKERS = 8
+
+# Maximum number of values in InstanceIds filter of describe_instance_information
+INSTANCE_IDS_BATCH_SIZE = 50
+
+# Maximum number of invocations returned by list_command_invocations page
+INVOCATIONS_PAGE_SIZE = 50
+
+THROTTLING_ERROR_CODES = ['ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded']
+
+COMPLETED_STATUSES = ['Success', 'Cancelled', 'TimedOut', 'Failed']
+
+# Status of the tasks that were not run because the tasks they depend on did not succeed
+SKIPPED_STATUS = 'Skipped'
+
+# Outputs of the concurrently running commands are printed one instance at a time.
+OUTPUT_LOCK = threading.Lock()
+
+# Prefix of EC2 instance tags with the hash of the last successful Chef run attributes and cookbooks version
+CHEF_RUN_HASH_TAG = 'ArcGISChefRunHash'
+
+# Maximum length of EC2 tag keys
+MAX_TAG_KEY_LENGTH = 128
+
+# JSON payloads larger than the maximum size of standard tier SSM parameters are passed through S3.
+PAYLOAD_SIZE_THRESHOLD = 4096 # bytes
+
+
+class PollInterval:
+
+    def __init__(self, minimum=MIN_POLL_INTERVAL, maximum=MAX_POLL_INTERVAL):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = minimum
+
+    # Returns the jittered current interval and increases the interval for the next poll.
+    def next(self):
+        interval = self.interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+        self.interval = min(self.interval * POLL_BACKOFF, self.maximum)
+        return interval
+
+    def reset(self):
+        self.interval = self.minimum
+
+    # Doubles the interval after the request was throttled.
+    def throttled(self):
+        self.interval = min(self.interval * 2, self.maximum)
+
+
+# Returns True if the exception is a throttling error returned by AWS API.
+def is_throttling_error(e):
+    return getattr(e, 'response', {}).get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+# Prints the table with status of the command invocation on each instance.
+def print_invocation_statuses(statuses: dict):
+    for instance_id in sorted(statuses):
+        print("  {0}: {1}".format(instance_id, statuses[instance_id]))
+
+
+# Returns EC2 filters of the running instances of the deployment in the specified machine roles.
+def deployment_ec2_filters(enterprise_id, deployment_id, machine_roles):
+    return [{
+        'Name': 'tag:ArcGISEnterpriseID',
+        'Values': [enterprise_id]
+    }, {
+        'Name': 'tag:ArcGISDeploymentID',
+        'Values': [deployment_id]
+    }, {
+        'Name': 'tag:ArcGISMachineRole',
+        'Values': machine_roles
+    }, {
+        'Name': 'instance-state-name',
+        'Values': ['pending', 'running']
+    }]
+
+
+# Returns SSM filters and command targets of the deployment instances in the specified machine roles.
+def deployment_ssm_filters(enterprise_id, deployment_id, machine_roles):
+    return [{
+        'Key': 'tag:ArcGISEnterpriseID',
+        'Values': [enterprise_id]
+    }, {
+        'Key': 'tag:ArcGISDeploymentID',
+        'Values': [deployment_id]
+    }, {
+        'Key': 'tag:ArcGISMachineRole',
+        'Values': machine_roles
+    }]
+
+
+# Returns dictionary of machine roles of the specified EC2 instances.
+def describe_instance_roles(ec2_client, instance_ids):
+    return {instance_id: tags.get('ArcGISMachineRole')
+            for instance_id, tags in describe_instance_tags(ec2_client, instance_ids).items()}
+
+
+# Returns dictionary of instance ID -> dictionary of tags of the specified EC2 instances.
+def describe_instance_tags(ec2_client, instance_ids):
+    instance_tags = {}
+
+    for page in ec2_client.get_paginator('describe_instances').paginate(InstanceIds=instance_ids):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                instance_tags[instance['InstanceId']] = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+
+    return instance_tags
+
+
+# Returns SHA-256 hash of the Chef JSON attributes and the cookbooks version.
+# The attributes are normalized, so formatting and keys order changes do not change the hash.
+def chef_run_hash(json_attributes: str, cookbooks_version: str):
+    try:
+        json_attributes = json.dumps(json.loads(json_attributes), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        pass
+
+    sha256 = hashlib.sha256()
+    sha256.update(json_attributes.encode('utf-8'))
+    sha256.update(b'\n')
+    sha256.update((cookbooks_version or '').encode('utf-8'))
+
+    return sha256.hexdigest()
+
+
+# Uploads the gzip-compressed JSON payload to SSE-KMS encrypted S3 object in <deployment_id>/payloads
+# folder of the bucket. Each run uploads the payload to a new object, which must be deleted by
+# delete_s3_payload() after the command completes.
+# Returns S3 URL of the object and SHA-256 hash of the payload.
+def put_s3_payload(s3_client, s3_bucket, deployment_id, payload: str):
+    data = payload.encode('utf-8')
+    sha256 = hashlib.sha256(data).hexdigest()
+    key = '{0}/payloads/{1}.json.gz'.format(deployment_id, uuid.uuid4())
+    url = 's3://{0}/{1}'.format(s3_bucket, key)
+
+    body = gzip.compress(data, mtime=0)
+
+    print("Uploading payload {0} ({1} bytes compressed to {2} bytes)...".format(url, len(data), len(body)))
+
+    s3_client.put_object(
+        Bucket=s3_bucket,
+        Key=key,
+        Body=body,
+        ContentType='application/gzip',
+        ServerSideEncryption='aws:kms',
+        Metadata={'sha256': sha256}
+    )
+
+    return url, sha256
+
+
+# Deletes the S3 object of the payload uploaded by put_s3_payload().
+def delete_s3_payload(s3_client, payload_url):
+    bucket, _, key = payload_url[len('s3://'):].partition('/')
+
+    print("Deleting payload {0}...".format(payload_url))
+
+    s3_client.delete_object(Bucket=bucket, Key=key)
+
+
+# Returns the key of the instance tag with the Chef run hash of the specified Chef configuration,
+# such as the JSON attributes SSM parameter name, so that different configurations applied
+# to the same instances do not overwrite each other's hashes.
+def chef_run_hash_tag(config: str):
+    tag = '{0}:{1}'.format(CHEF_RUN_HASH_TAG, config)
+
+    if len(tag) > MAX_TAG_KEY_LENGTH:
+        tag = '{0}:{1}'.format(CHEF_RUN_HASH_TAG, hashlib.sha256(config.encode('utf-8')).hexdigest()[:32])
+
+    return tag
+
+
+# Returns the cookbooks version that includes ETag of the cookbooks archive if the archive is in S3,
+# so that republishing the archive at the same URL changes the version.
+# The ETag is not available for HTTP URLs, and the version is the URL itself in that case.
+def cookbooks_version(s3_client, cookbooks_url: str):
+    if not cookbooks_url.startswith('s3://'):
+        return cookbooks_url
+
+    bucket, _, key = cookbooks_url[len('s3://'):].partition('/')
+
+    try:
+        return '{0}#{1}'.format(cookbooks_url, s3_client.head_object(Bucket=bucket, Key=key)['ETag'])
+    except s3_client.exceptions.ClientError as e:
+        print("Failed to retrieve ETag of {0}: {1}".format(cookbooks_url, e))
+        return cookbooks_url
+
+
+# Records the Chef run hash in the hash tag of the instances where Chef run succeeded,
+# and removes the tag from the instances where Chef run failed, so that Chef runs there next time.
+def update_chef_run_hash(ec2_client, hash_tag, run_hash, succeeded_ids, failed_ids):
+    for i in range(0, len(succeeded_ids), INSTANCE_IDS_BATCH_SIZE):
+        ec2_client.create_tags(Resources=succeeded_ids[i:i + INSTANCE_IDS_BATCH_SIZE],
+                               Tags=[{'Key': hash_tag, 'Value': run_hash}])
+
+    for i in range(0, len(failed_ids), INSTANCE_IDS_BATCH_SIZE):
+        ec2_client.delete_tags(Resources=failed_ids[i:i + INSTANCE_IDS_BATCH_SIZE],
+                               Tags=[{'Key': hash_tag}])
+
+
+# Returns True if the number of failed invocations does not exceed max_errors,
+# specified as an absolute number or as a percentage of the invocations, such as '10%'.
+def errors_within_limit(failed_count, invocation_count, max_errors):
+    if max_errors is None:
+        return failed_count == 0
+
+    if max_errors.endswith('%'):
+        return failed_count * 100 <= float(max_errors[:-1]) * invocation_count
+
+    return failed_count <= int(max_errors)
+
+
+# Sends SSM command to the deployment instances in the specified machine roles, waits for the
+# command invocations to complete, and prints outputs of the command invocations.
+# max_concurrency and max_errors are passed to SSM to control the rate of the command invocations,
+# for example, to run rolling updates. If max_errors is specified, the command succeeds when
+# the number of failed invocations does not exceed max_errors.
+# If target_instance_ids is True, the command targets instance_ids instead of all the deployment
+# instances in the machine roles. SSM command accepts up to INSTANCE_IDS_BATCH_SIZE instance IDs.
+# Optional on_complete(instance_id, status) callback is called when the invocation on an instance completes.
+# Returns the command status.
+def run_command(ssm_client, s3_client, enterprise_id, deployment_id, machine_roles, document_name,
+                parameters, comment, execution_timeout, s3_bucket, instance_ids=None,
+                max_concurrency=None, max_errors=None, target_instance_ids=False, on_complete=None):
+    if target_instance_ids:
+        targets = {'InstanceIds': instance_ids}
+    else:
+        targets = {'Targets': deployment_ssm_filters(enterprise_id, deployment_id, machine_roles)}
+
+    rate_control = {}
+
+    if max_concurrency:
+        rate_control['MaxConcurrency'] = max_concurrency
+
+    if max_errors:
+        rate_control['MaxErrors'] = max_errors
+
+    command_id = ssm_client.send_command(
+        DocumentName=document_name,
+        TimeoutSeconds=SEND_TIMEOUT,
+        Comment=comment,
+        Parameters=parameters,
+        OutputS3BucketName=s3_bucket,
+        OutputS3KeyPrefix=deployment_id,
+        **targets,
+        **rate_control
+    )['Command']['CommandId']
+
+    output_printer = CommandOutputPrinter(s3_client, deployment_id, command_id, s3_bucket)
+
+    statuses = {}
+
+    def on_invocation_complete(instance_id, status, invocation):
+        statuses[instance_id] = status
+        output_printer.on_complete(instance_id, status, invocation)
+        if on_complete:
+            on_complete(instance_id, status)
+
+    # With max_errors, the other invocations continue after an invocation fails.
+    status = wait_for_command_invocations(ssm_client, command_id, execution_timeout,
+                                          on_complete=on_invocation_complete,
+                                          fail_fast=not max_errors,
+                                          instance_ids=instance_ids)
+
+    output_printer.finish()
+
+    if max_errors and status != 'TimedOut':
+        failed_count = len([s for s in statuses.values() if s != 'Success'])
+        status = 'Success' if errors_within_limit(failed_count, len(statuses), max_errors) else 'Failed'
+
+    return status
+
+
+# Validates the task dependencies.
+# dependencies: dictionary of task name -> list of tasks it depends on
+# Raises ValueError if a task depends on an unknown task or the dependencies are circular.
+def validate_dependencies(dependencies: dict):
+    for name, depends_on in dependencies.items():
+        for dependency in depends_on:
+            if dependency not in dependencies:
+                raise ValueError("'{0}' depends on unknown '{1}'.".format(name, dependency))
+
+    ordered = set()
+
+    while len(ordered) < len(dependencies):
+        ready = [name for name, depends_on in dependencies.items()
+                 if name not in ordered and all(d in ordered for d in depends_on)]
+
+        if not ready:
+            raise ValueError("Circular dependencies between {0}.".format(
+                             ', '.join(sorted(set(dependencies) - ordered))))
+
+        ordered.update(ready)
+
+
+# Runs the tasks concurrently, starting each task as soon as all the tasks it depends on succeeded.
+# Independent tasks run at the same time, and dependent tasks run in waves after their dependencies,
+# so the total run time is the time of the longest chain of dependent tasks.
+# tasks: dictionary of task name -> (dependencies, job), where job() returns the task status
+# Tasks that depend on tasks that did not succeed are skipped.
+# Returns dictionary of task name -> status.
+def run_tasks(tasks: dict):
+    validate_dependencies({name: dependencies for name, (dependencies, _) in tasks.items()})
+
+    statuses = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, len(tasks))) as executor:
+        running = {}
+
+        while len(statuses) < len(tasks):
+            scheduled = True
+
+            while scheduled:
+                scheduled = False
+
+                for name, (dependencies, job) in tasks.items():
+                    if name in statuses or name in running.values():
+                        continue
+
+                    if any(statuses.get(d, 'Success') != 'Success' for d in dependencies):
+                        print("Skipping '{0}' because its dependencies did not succeed.".format(name))
+                        statuses[name] = SKIPPED_STATUS
+                        scheduled = True
+                    elif all(d in statuses for d in dependencies):
+                        running[executor.submit(job)] = name
+                        scheduled = True
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+
+                try:
+                    statuses[name] = future.result()
+                except Exception as e:
+                    print("'{0}' failed: {1}".format(name, e))
+                    statuses[name] = 'Failed'
+
+    return statuses
+
+
+# Returns IDs of the EC2 instances that match the filters.
+def describe_instance_ids(ec2_client, ec2_filters):
+    instance_ids = []
+
+    for page in ec2_client.get_paginator('describe_instances').paginate(Filters=ec2_filters):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                instance_ids.append(instance['InstanceId'])
+
+    return instance_ids
+
+
+# Returns IDs of the managed instances that match the filters and are online.
+# If instance_ids is specified, only the specified instances are queried in batches.
+def online_instance_ids(ssm_client, ssm_filters, instance_ids=None):
+    if instance_ids is None:
+        batches = [ssm_filters]
+    else:
+        batches = [ssm_filters + [{'Key': 'InstanceIds', 'Values': instance_ids[i:i + INSTANCE_IDS_BATCH_SIZE]}]
+                   for i in range(0, len(instance_ids), INSTANCE_IDS_BATCH_SIZE)]
+
+    online_ids = set()
+    paginator = ssm_client.get_paginator('describe_instance_information')
+
+    for filters in batches:
+        for page in paginator.paginate(Filters=filters):
+            for instance in page['InstanceInformationList']:
                 if instance['PingStatus'] == 'Online':
-                    online_instance_count += 1
+                    online_ids.add(instance['InstanceId'])
+
+    return online_ids
+
+
+# Wait until the target EC2 instances status is online.
+# The target EC2 instances are discovered on each poll, so the instances that are still launching or
+# were added while waiting are waited for as well. Only the discovered instances that are not online
+# yet are queried in SSM. Returns sorted list of the target instance IDs or None if the instances
+# are not online within the timeout.
+def wait_for_target_instances(ec2_client, ssm_client, ec2_filters, ssm_filters, wait_timeout):
+    deadline = time.monotonic() + wait_timeout
+    poll_interval = PollInterval(MIN_POLL_INTERVAL, SLEEP_TIME)
+    instance_ids = []
+    online_ids = set()
+
+    while True:
+        try:
+            instance_ids = describe_instance_ids(ec2_client, ec2_filters)
+
+            if instance_ids:
+                # Forget the instances that do not match the filters anymore.
+                online_ids.intersection_update(instance_ids)
+
+                offline_ids = [i for i in instance_ids if i not in online_ids]
+
+                if offline_ids:
+                    online_ids.update(online_instance_ids(ssm_client, ssm_filters, offline_ids))
+
+                print("{0} of {1} target instances are online.".format(len(online_ids), len(instance_ids)))
 
-            print("{0} of {1} target instances are online.".format(online_instance_count, ec2_instance_count))
+                if len(online_ids) == len(instance_ids):
+                    return sorted(instance_ids)
+        except Exception as e:
+            if not is_throttling_error(e):
+                raise
+            print("Target instances polling is throttled.")
+            poll_interval.throttled()
 
-            if online_instance_count == ec2_instance_count:
-                return True
+        if time.monotonic() + poll_interval.interval > deadline:
+            break
+
+        sleep(poll_interval.next())
 
-        sleep(SLEEP_TIME)
-    
     print("Target instances are not online.")
-    return False
+    return None
+
+
+# Returns the command invocations.
+# If instance_ids is specified, the invocations are retrieved for each instance separately.
+# Otherwise all the invocations of the command are listed page by page.
+def list_command_invocations(ssm_client, command_id, instance_ids=None):
+    invocations = []
+
+    if instance_ids is not None:
+        for instance_id in instance_ids:
+            invocations.extend(ssm_client.list_command_invocations(
+                CommandId=command_id,
+                InstanceId=instance_id
+            )['CommandInvocations'])
+        return invocations
+
+    for page in ssm_client.get_paginator('list_command_invocations').paginate(CommandId=command_id):
+        invocations.extend(page['CommandInvocations'])
+
+    return invocations
+
+
+# Wait for the command invocations to complete.
+# The invocations are polled with adaptive intervals, starting with short intervals for short commands
+# and backing off for long running commands or when the requests are throttled.
+# on_complete(instance_id, status, invocation) callback is called when the invocation on an instance completes.
+# If fail_fast is True, returns the status of the first failed invocation without waiting for the other invocations.
+# Otherwise waits for all the invocations and returns 'Success' only if all the invocations succeeded.
+# If the target instance_ids are specified, once invocations on all the instances are listed and only
+# a few invocations remain in progress, the remaining invocations are queried per instance.
+def wait_for_command_invocations(ssm_client, command_id, execution_timeout, on_complete=None, fail_fast=True,
+                                 instance_ids=None):
+    deadline = time.monotonic() + execution_timeout
+    poll_interval = PollInterval()
+    statuses = {}
+    failed_status = None
+
+    while time.monotonic() < deadline:
+        sleep(min(poll_interval.next(), max(0, deadline - time.monotonic())))
+
+        # Querying the pending invocations per instance takes fewer requests than listing all the invocations.
+        pending_ids = None
 
-# Wait for the command invocations to complete
-def wait_for_command_invocations(ssm_client, command_id, execution_timeout):
-    for i in range(execution_timeout // SLEEP_TIME):
-        invocations = ssm_client.list_command_invocations(
-            CommandId=command_id,
-        )['CommandInvocations']
+        if instance_ids and all(instance_id in statuses for instance_id in instance_ids):
+            pending_ids = [i for i, status in statuses.items() if status not in COMPLETED_STATUSES]
+            if len(pending_ids) >= -(-len(statuses) // INVOCATIONS_PAGE_SIZE):
+                pending_ids = None
+
+        try:
+            invocations = list_command_invocations(ssm_client, command_id, pending_ids)
+        except Exception as e:
+            if not is_throttling_error(e):
+                raise
+            print("Command invocations polling is throttled.")
+            poll_interval.throttled()
+            continue
 
         if len(invocations) == 0:
-            sleep(SLEEP_TIME)
             continue
 
-        pending_executions_count = 0
+        completed = []
 
         for invocation in invocations:
-            if invocation['Status'] in ['Pending', 'InProgress']:
-                pending_executions_count += 1
-            elif invocation['Status'] in ['Cancelled', 'TimedOut', 'Failed']:
-                print("Command {0} invocation {1} on instance {2}."
-                      .format(command_id, invocation['Status'], invocation['InstanceId']))
-                return invocation['Status']
-        
-        if pending_executions_count == 0:
+            instance_id = invocation['InstanceId']
+            status = invocation['Status']
+
+            if statuses.get(instance_id) == status:
+                continue
+
+            statuses[instance_id] = status
+
+            if status in COMPLETED_STATUSES:
+                completed.append(invocation)
+
+        completed_count = len([s for s in statuses.values() if s in COMPLETED_STATUSES]) - len(completed)
+
+        for invocation in completed:
+            instance_id = invocation['InstanceId']
+            status = invocation['Status']
+            completed_count += 1
+
+            print("Command {0} invocation {1} on instance {2} ({3} of {4} completed)."
+                  .format(command_id, status, instance_id, completed_count, len(statuses)))
+
+            if on_complete is not None:
+                on_complete(instance_id, status, invocation)
+
+            if status != 'Success' and failed_status is None:
+                failed_status = status
+
+        if failed_status is not None and fail_fast:
+            print_invocation_statuses(statuses)
+            return failed_status
+
+        if all(status in COMPLETED_STATUSES for status in statuses.values()):
+            if failed_status is not None:
+                print_invocation_statuses(statuses)
+                return failed_status
             return 'Success'
 
-        sleep(SLEEP_TIME)
-    
+        if completed:
+            poll_interval.reset()
+
     print("Command invocations timed out.")
+    print_invocation_statuses(statuses)
     return 'TimedOut'
 
-# Retrieve from S3 and prints outputs of the command invocations.
-def print_command_output(s3_client, deployment_id, command_id, s3_bucket):
-    key_prefix = deployment_id + '/' + command_id 
 
-    keys = s3_client.list_objects_v2(Bucket=s3_bucket, MaxKeys=1000, Prefix=key_prefix)
+# Retrieves from S3 and prints outputs of the command invocations grouped by instance.
+# The output objects are listed page by page and downloaded concurrently. If on_complete() is
+# passed as the callback of wait_for_command_invocations(), the output uploaded by the time the
+# invocation on an instance completes is printed right away, while the invocations on the other
+# instances are still in progress. finish() prints all the output objects that were not printed yet,
+# such as stderr uploaded after stdout.
+class CommandOutputPrinter:
+
+    def __init__(self, s3_client, deployment_id, command_id, s3_bucket, workers=OUTPUT_WORKERS):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.key_prefix = deployment_id + '/' + command_id + '/'
+        self.printed = set()
+        self._printed_keys = set()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._pending = []
+
+    def _list_keys(self, prefix):
+        keys = []
+
+        for page in self.s3_client.get_paginator('list_objects_v2').paginate(Bucket=self.s3_bucket, Prefix=prefix):
+            keys.extend(key['Key'] for key in page.get('Contents', []))
+
+        return sorted(keys)
+
+    def _read(self, key):
+        response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)
+        return response['Body'].read().decode('UTF-8', 'ignore')
+
+    def _instance_id(self, key):
+        return key[len(self.key_prefix):].split('/')[0]
+
+    def _print(self, instance_id, outputs):
+        with OUTPUT_LOCK:
+            outputs = [(key, output) for key, output in outputs if key not in self._printed_keys]
+
+            if not outputs:
+                return
+
+            self._printed_keys.update(key for key, _ in outputs)
 
-    if 'Contents' in keys:
-        for key in keys['Contents']:
-            object = s3_client.get_object(Bucket=s3_bucket, Key=key['Key'])
             print()
-            print("*** {0} ***".format(key['Key']))
-            # print(object['Body'].read().decode('iso-8859-1', 'ignore'))
-            for line in object['Body'].iter_lines():
-                try:
-                    print(line.decode('UTF-8', 'ignore'))
-                except:
-                    print(line)
+            if instance_id in self.printed:
+                print("=== Instance {0} (continued) ===".format(instance_id))
+            else:
+                print("=== Instance {0} ===".format(instance_id))
+
+            self.printed.add(instance_id)
+
+            for key, output in outputs:
+                print()
+                print("*** {0} ***".format(key))
+                print(output.rstrip('\n'))
+
+    def _print_instance(self, instance_id):
+        keys = self._list_keys(self.key_prefix + instance_id + '/')
+
+        # Some output objects may not be uploaded to S3 yet when the invocation completes.
+        # These objects are printed by finish().
+        if keys:
+            self._print(instance_id, [(key, self._read(key)) for key in keys])
+
+    # Callback of wait_for_command_invocations() that prints the instance output in the background.
+    def on_complete(self, instance_id, status, invocation):
+        self._pending.append(self._executor.submit(self._print_instance, instance_id))
+
+    # Prints the outputs that were not printed yet.
+    def finish(self):
+        for future in self._pending:
+            try:
+                future.result()
+            except Exception as e:
+                print("Failed to retrieve command output: {0}".format(e))
+
+        keys = [key for key in self._list_keys(self.key_prefix) if key not in self._printed_keys]
+
+        outputs = {}
+
+        for key, output in zip(keys, self._executor.map(self._read, keys)):
+            outputs.setdefault(self._instance_id(key), []).append((key, output))
+
+        for instance_id in sorted(outputs):
+            self._print(instance_id, outputs[instance_id])
+
+        self._executor.shutdown()
+
+
+# Retrieve from S3 and prints outputs of the command invocations.
+def print_command_output(s3_client, deployment_id, command_id, s3_bucket):
+    CommandOutputPrinter(s3_client, deployment_id, command_id, s3_bucket).finish()
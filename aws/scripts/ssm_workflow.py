@@ -0,0 +1,184 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# The script runs a workflow of SSM commands on EC2 instances of a deployment.
+#
+# The workflow steps are specified in a JSON file. The script waits for the target instances
+# of all the steps to be online once, and then runs the steps one after another using the same
+# AWS clients. Each step sends an SSM command to the deployment instances in the step's machine roles,
+# waits for the command invocations to complete, and prints outputs of the command invocations.
+# The workflow stops at the first failed step. The status and duration of each step are printed
+# at the end of the workflow.
+#
+# If any step has depends_on property, the steps run concurrently instead: each step starts as soon
+# as the steps it depends on succeeded, and the steps without depends_on property start immediately.
+# max_concurrency and max_errors properties of a step specify SSM command rate control, such as
+# "1" or "25%", to run rolling updates.
+#
+# Workflow JSON file format:
+#
+# {
+#   "steps": [
+#     {
+#       "name": "bootstrap",
+#       "document": "{enterprise_id}-bootstrap",
+#       "parameters": {
+#         "ChefClientUrl": "{{ssm:/arcgis/arcgis-enterprise/chef-client-url/rhel9}}",
+#         "ChefCookbooksUrl": "{{ssm:/arcgis/arcgis-enterprise/cookbooks-url}}"
+#       },
+#       "machine_roles": ["primary", "standby"],
+#       "comment": "Installs Chef/Cinc client and Chef Cookbooks for ArcGIS on EC2 instances.",
+#       "execution_timeout": 1800,
+#       "depends_on": [],
+#       "max_concurrency": "50%",
+#       "max_errors": "0"
+#     }
+#   ]
+# }
+#
+# '{enterprise_id}' and '{deployment_id}' placeholders in the document names and parameter values
+# are replaced by the enterprise and deployment IDs. The steps without machine_roles property
+# run on the instances in the machine roles specified by the command line argument.
+
+import argparse
+import json
+from functools import partial
+import time
+import boto3
+import ssm_utils
+
+# Timeouts in seconds
+WAIT_TIMEOUT = 600
+EXECUTION_TIMEOUT = 1800
+
+
+# Replaces the enterprise and deployment ID placeholders in the value.
+def format_value(value, enterprise_id, deployment_id):
+    return value.replace('{enterprise_id}', enterprise_id).replace('{deployment_id}', deployment_id)
+
+
+# Returns the step command parameters. SSM command parameter values must be lists of strings.
+def step_parameters(step, enterprise_id, deployment_id):
+    parameters = {}
+
+    for name, value in step.get('parameters', {}).items():
+        values = value if isinstance(value, list) else [value]
+        parameters[name] = [format_value(str(v), enterprise_id, deployment_id) for v in values]
+
+    return parameters
+
+
+def print_summary(results):
+    print()
+    print("Workflow summary:")
+
+    for name, status, duration in results:
+        if status == ssm_utils.SKIPPED_STATUS:
+            print("  {0}: {1}".format(name, status))
+        else:
+            print("  {0}: {1} ({2:.1f} s)".format(name, status, duration))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='ssm_workflow.py',
+        description='Runs a workflow of SSM commands on EC2 instances of a deployment.')
+
+    parser.add_argument('-s', dest='enterprise_id', required=True, help='ArcGIS Enterprise ID')
+    parser.add_argument('-d', dest='deployment_id', required=True, help='ArcGIS Enterprise deployment ID')
+    parser.add_argument('-m', dest='machine_roles', default='', help='Default machine roles of the workflow steps')
+    parser.add_argument('-f', dest='workflow_file', required=True, help='Workflow JSON file path')
+    parser.add_argument('-b', dest='s3_bucket', required=True, help='Output S3 bucket')
+
+    args = parser.parse_args()
+
+    with open(args.workflow_file, 'r') as f:
+        steps = json.load(f)['steps']
+
+    default_roles = [role for role in args.machine_roles.split(',') if role]
+
+    # Without explicit dependencies each step depends on the previous step.
+    concurrent = any('depends_on' in step for step in steps)
+
+    for i, step in enumerate(steps):
+        step.setdefault('machine_roles', default_roles)
+
+        if not concurrent:
+            step['depends_on'] = [steps[i - 1]['name']] if i > 0 else []
+
+        if not step['machine_roles']:
+            print("Machine roles are not specified for step '{0}'.".format(step['name']))
+            exit(1)
+
+    try:
+        ssm_utils.validate_dependencies({step['name']: step.get('depends_on', []) for step in steps})
+    except ValueError as e:
+        print("Invalid workflow step dependencies. {0}".format(e))
+        exit(1)
+
+    # The clients are shared by all the workflow steps.
+    session = boto3.Session()
+    ec2_client = session.client('ec2')
+    ssm_client = session.client('ssm')
+    s3_client = session.client('s3')
+
+    # Wait for the target instances of all the steps once.
+    all_roles = sorted(set(role for step in steps for role in step['machine_roles']))
+
+    start = time.monotonic()
+
+    instance_ids = ssm_utils.wait_for_target_instances(
+        ec2_client, ssm_client,
+        ssm_utils.deployment_ec2_filters(args.enterprise_id, args.deployment_id, all_roles),
+        ssm_utils.deployment_ssm_filters(args.enterprise_id, args.deployment_id, all_roles),
+        WAIT_TIMEOUT)
+
+    if not instance_ids:
+        exit(1)
+
+    instance_roles = ssm_utils.describe_instance_roles(ec2_client, instance_ids)
+
+    results = [('wait for target instances', 'Success', time.monotonic() - start)]
+    durations = {}
+
+    def run_step(step):
+        print()
+        print("Running step '{0}'...".format(step['name']))
+
+        step_start = time.monotonic()
+
+        try:
+            return ssm_utils.run_command(
+                ssm_client, s3_client, args.enterprise_id, args.deployment_id, step['machine_roles'],
+                format_value(step['document'], args.enterprise_id, args.deployment_id),
+                step_parameters(step, args.enterprise_id, args.deployment_id),
+                step.get('comment', step['name']),
+                int(step.get('execution_timeout', EXECUTION_TIMEOUT)),
+                args.s3_bucket,
+                [i for i in instance_ids if instance_roles.get(i) in step['machine_roles']],
+                step.get('max_concurrency'),
+                step.get('max_errors'))
+        finally:
+            durations[step['name']] = time.monotonic() - step_start
+
+    statuses = ssm_utils.run_tasks({
+        step['name']: (step.get('depends_on', []), partial(run_step, step)) for step in steps
+    })
+
+    for step in steps:
+        results.append((step['name'], statuses[step['name']], durations.get(step['name'])))
+
+    print_summary(results)
+
+    exit(0 if all(status == 'Success' for status in statuses.values()) else 1)
@@ -0,0 +1,116 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Selects part size and concurrency of multipart uploads based on the file size and measured throughput.
+#
+# Files smaller than the minimum part size are uploaded in a single request by a single thread.
+# The part size of larger files grows with the file size to keep the number of parts within
+# the multipart upload limits. The number of threads is derived from the time it would take
+# to upload the file at the throughput of a single upload stream, which is estimated using
+# exponentially weighted moving average of the throughput measured for the previous uploads.
+
+import math
+import threading
+import time
+
+MB = 1024 * 1024
+
+MIN_PART_SIZE = 8 * MB
+MAX_PART_SIZE = 512 * MB
+# Maximum number of parts per multipart upload (S3 allows 10000 parts, Azure allows 50000 blocks).
+MAX_PARTS = 10000
+# Number of parts the file is split into before the part size is increased.
+TARGET_PARTS = 1000
+DEFAULT_MAX_CONCURRENCY = 16
+# Initial estimate of a single upload stream throughput in MB/s.
+DEFAULT_STREAM_THROUGHPUT = 25.0
+# Upload duration in seconds per thread used to compute the number of threads.
+SECONDS_PER_THREAD = 10
+# Weight of the latest measurement in the throughput moving average.
+EWMA_ALPHA = 0.3
+
+
+class TransferTuner:
+
+    # part_size: if specified, overrides the part size in bytes
+    # max_concurrency: maximum number of threads used to upload a single file
+    def __init__(self, part_size=None, max_concurrency=None):
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency if max_concurrency else DEFAULT_MAX_CONCURRENCY
+        self.stream_throughput = DEFAULT_STREAM_THROUGHPUT
+        self._lock = threading.Lock()
+
+    # Returns the part size in bytes for the file size.
+    def part_size_for(self, size: int):
+        if self.part_size:
+            return max(self.part_size, math.ceil(size / MAX_PARTS))
+
+        part_size = max(MIN_PART_SIZE, math.ceil(size / TARGET_PARTS))
+
+        # Round the part size up to whole megabytes
+        return min(MAX_PART_SIZE, math.ceil(part_size / MB) * MB)
+
+    # Returns (part_size, concurrency) tuple for the file size.
+    def settings(self, size: int):
+        part_size = self.part_size_for(size)
+        parts = max(1, math.ceil(size / part_size))
+
+        with self._lock:
+            seconds = size / MB / self.stream_throughput
+
+        concurrency = math.ceil(seconds / SECONDS_PER_THREAD)
+
+        return part_size, max(1, min(concurrency, parts, self.max_concurrency))
+
+    # Records the upload of size bytes by the specified number of threads that took elapsed seconds
+    # and returns the upload throughput in MB/s.
+    def record(self, size: int, elapsed: float, concurrency: int):
+        if elapsed <= 0:
+            return 0.0
+
+        throughput = size / MB / elapsed
+
+        # Uploads of small files are dominated by the request latency and do not represent the stream throughput.
+        if size >= MIN_PART_SIZE:
+            with self._lock:
+                self.stream_throughput = (EWMA_ALPHA * throughput / concurrency +
+                                          (1 - EWMA_ALPHA) * self.stream_throughput)
+
+        return throughput
+
+    # Calls upload(part_size, concurrency) with the settings for the file size, records the upload throughput,
+    # and prints the effective throughput.
+    def upload(self, name: str, size: int, upload, action='uploaded'):
+        part_size, concurrency = self.settings(size)
+
+        start = time.perf_counter()
+        result = upload(part_size, concurrency)
+        elapsed = time.perf_counter() - start
+
+        throughput = self.record(size, elapsed, concurrency)
+
+        print("'{0}' {1} ({2:.1f} MB at {3:.1f} MB/s, {4} MB parts, {5} threads)".format(
+              name, action, size / MB, throughput, part_size // MB, concurrency))
+
+        return result
+
+
+# Parses size in megabytes specified by command line argument.
+def megabytes(value: str):
+    size = int(value)
+
+    if size < 5:
+        raise ValueError("Part size must be at least 5 MB.")
+
+    return size * MB
@@ -0,0 +1,109 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Helper functions used by scripts that transfer files to and from repositories.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+RETRY_DELAY = 5 # seconds
+
+# Transfer job results
+COPIED = 'copied'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+class TransferSummary:
+
+    def __init__(self):
+        self.copied = []
+        self.skipped = []
+        self.failed = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, status: str, error=None):
+        with self._lock:
+            if status == COPIED:
+                self.copied.append(name)
+            elif status == SKIPPED:
+                self.skipped.append(name)
+            else:
+                self.failed[name] = error
+
+    # Adds results of another summary to this summary.
+    def merge(self, other):
+        with self._lock:
+            self.copied.extend(other.copied)
+            self.skipped.extend(other.skipped)
+            self.failed.update(other.failed)
+
+    def succeeded(self):
+        return len(self.failed) == 0
+
+    def print(self):
+        print("{0} files copied, {1} files skipped, {2} files failed."
+              .format(len(self.copied), len(self.skipped), len(self.failed)))
+
+        for name, error in self.failed.items():
+            print("Failed to copy '{0}': {1}".format(name, error))
+
+
+# Runs the job with retries.
+# The delay between the attempts grows exponentially starting from RETRY_DELAY seconds.
+def run_with_retries(name: str, job, retries: int):
+    attempt = 0
+
+    while True:
+        try:
+            return job()
+        except Exception as e:
+            if attempt >= retries:
+                raise
+
+            delay = RETRY_DELAY * (2 ** attempt)
+            attempt += 1
+
+            print("Copy of '{0}' failed: {1}".format(name, e))
+            print("Retrying copy of '{0}' in {1} seconds ({2}/{3})...".format(name, delay, attempt, retries))
+
+            time.sleep(delay)
+
+
+# Runs the transfer jobs concurrently using a bounded pool of worker threads.
+# jobs: list of (name, job) tuples, where job is a callable that returns COPIED or SKIPPED
+# workers: maximum number of concurrently running jobs
+# retries: number of retries of each failed job
+# Returns TransferSummary with the names of copied, skipped, and failed files.
+def run_transfers(jobs: list, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES):
+    summary = TransferSummary()
+
+    if not jobs:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(run_with_retries, name, job, retries): name for name, job in jobs}
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                status = future.result()
+                summary.add(name, SKIPPED if status == SKIPPED else COPIED)
+            except Exception as e:
+                summary.add(name, FAILED, e)
+
+    return summary
@@ -14,7 +14,7 @@
  * * Azure credentials must be configured
  */
 
-# Copyright 2025 Esri
+# Copyright 2025-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -34,6 +34,6 @@ resource "null_resource" "az_copy_files" {
   }
     
   provisioner "local-exec" {
-    command = "python -m az_copy_files -f ${var.index_file} -a ${var.storage_account_blob_endpoint} -c ${var.container_name}"
+    command = "python -m az_copy_files -f ${var.index_file} -a ${var.storage_account_blob_endpoint} -c ${var.container_name}${var.source_repository != null ? " -o ${var.source_repository}" : ""}"
   }
 }
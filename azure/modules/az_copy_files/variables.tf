@@ -1,4 +1,4 @@
-# Copyright 2025 Esri
+# Copyright 2025-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -27,3 +27,9 @@ variable "index_file" {
   description = "Index file local path"
   type = string
 } 
+
+variable "source_repository" {
+  description = "Source repository Azure Blob Storage container URL or S3 bucket name to replicate files from"
+  type = string
+  default = null
+}
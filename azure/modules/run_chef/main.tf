@@ -6,6 +6,11 @@
  * The module runs az_run_chef.py python script that creates a Key Vault secret with Chef JSON attributes and
  * runs Azure Managed command on the deployment's Azure VMs in specific roles.
  *
+ * If skip_converged variable is set to true, Chef run is skipped on the VMs where the last successful
+ * Chef run used the same JSON attributes and cookbooks. The hash of the attributes and cookbooks version
+ * is recorded in ArcGISChefRunHash-<secret name> tag of the VMs. Don't set skip_converged for Chef runs
+ * that must run every time, such as backups.
+ *
  * ## Requirements
  *
  * On the machine where Terraform is executed:
@@ -55,6 +60,6 @@ resource "null_resource" "run_chef" {
       JSON_ATTRIBUTES = nonsensitive(base64encode(var.json_attributes))
     }
 
-    command = "python -m az_run_chef -s ${var.enterprise_id} -d ${var.deployment_id} -m ${join(",", var.machine_roles)} -j ${var.json_attributes_secret} -v ${data.azurerm_key_vault.enterprise_vault.name} -e ${var.execution_timeout}"
+    command = "python -m az_run_chef -s ${var.enterprise_id} -d ${var.deployment_id} -m ${join(",", var.machine_roles)} -j ${var.json_attributes_secret} -v ${data.azurerm_key_vault.enterprise_vault.name} -e ${var.execution_timeout}${var.skip_converged ? " -u" : ""}"
   }
 }
@@ -58,3 +58,9 @@ variable "machine_roles" {
   description = "List of machine roles."
   type = list(string)
 }   
+
+variable "skip_converged" {
+  description = "Skip Chef run on the VMs that are already converged with the same JSON attributes and cookbooks"
+  type = bool
+  default = false
+}
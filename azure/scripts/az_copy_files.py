@@ -1,4 +1,4 @@
-# Copyright 2025 Esri
+# Copyright 2025-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -15,77 +15,267 @@
 # Copies files from local file system, public URLs, My Esri, and ArcGIS patch repositories to Azure Blob Storage.
 
 import argparse
-import hashlib
+import base64
 import json
 import os
 import sys
 import tempfile
-import urllib
+import time
 import fnmatch
+from concurrent.futures import ThreadPoolExecutor
 
 from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobClient, BlobSasPermissions, BlobServiceClient, ContainerClient, generate_blob_sas
+import hash_utils
+from transfer_tuning import TransferTuner, megabytes
 from downloads_api import DownloadsAPIClient
 from token_service_client import TokenServiceClient
-from patch_notification import PatchNotification
+from datetime import datetime, timedelta, timezone
+from patch_notification import PatchNotification, watermark_property, watermark_since
+from repository_index import RepositoryIndex
 
-MAX_CONCURRENCY = 8
+# Expiration of the presigned and SAS URLs used to copy files from the source repository
+REPLICATION_URL_EXPIRATION = 6 * 3600 # seconds
+# Maximum size of blocks staged from URL
+MAX_URL_BLOCK_SIZE = 100 * 1024 * 1024
+COPY_STATUS_POLL_INTERVAL = 5 # seconds
 
-def azure_blob_sha256(container_client, blob_name):
+def blob_name_of(filename: str, subfolder: str):
+    if subfolder is None:
+        return filename
+    else:
+        return "{0}/{1}".format(subfolder, filename)
+
+
+# Returns SHA-256 hash metadata and size of the blob.
+def azure_blob_metadata(container_client, blob_name):
     try:
         blob_client = container_client.get_blob_client(blob_name)
-        sha256 = blob_client.get_blob_properties().metadata['sha256']
+        properties = blob_client.get_blob_properties()
+        sha256 = properties.metadata['sha256']
         print("Azure Blob SHA256=" + sha256)
-        return sha256.lower() if sha256 else None
+        return sha256.lower() if sha256 else None, properties.size
     except Exception as e:
-        return None
+        return None, None
 
 
-def copy_file(url: str, path: str, filename: str, subfolder: str, container_client, sha256=None):
-    if subfolder is None:
-        blob_name = filename
+# Checks if the blob with the specified SHA-256 hash exists.
+# Blobs found by the check are added to the repository index.
+def azure_blob_exists(container_client, blob_name: str, sha256: str, url=None, index=None):
+    blob_sha256, size = azure_blob_metadata(container_client, blob_name)
+
+    if blob_sha256 is None or blob_sha256 != sha256:
+        return False
+
+    if index is not None:
+        index.update(blob_name, sha256, size, url)
+
+    return True
+
+
+# Returns a client of the blob that uploads the blob in blocks of the specified size.
+# The block size is a client setting, so a separate client is created for each upload.
+def tuned_blob_client(container_client, blob_name: str, block_size: int):
+    blob_url = container_client.get_blob_client(blob_name).url
+
+    return BlobClient.from_blob_url(blob_url,
+                                    credential=container_client.credential,
+                                    max_block_size=block_size,
+                                    max_single_put_size=block_size)
+
+
+# Returns the source repository for the replication mode.
+# source: Azure Blob Storage container URL or S3 bucket name
+def source_repository(source: str):
+    if source.startswith('https://'):
+        return ContainerClient.from_container_url(source, credential=DefaultAzureCredential())
+
+    try:
+        import boto3
+    except ImportError:
+        raise Exception("boto3 package is required to replicate files from S3.")
+
+    if source.startswith('s3://'):
+        source = source[len('s3://'):]
+
+    return boto3.resource('s3').Bucket(source.strip('/'))
+
+
+# Returns SHA-256 hash metadata and size of the file in the source repository.
+def source_metadata(source, blob_name: str):
+    if isinstance(source, ContainerClient):
+        return azure_blob_metadata(source, blob_name)
+
+    try:
+        response = source.meta.client.head_object(Bucket=source.name, Key=blob_name)
+        sha256 = response['Metadata'].get('sha256')
+        return sha256.lower() if sha256 else None, response['ContentLength']
+    except Exception:
+        return None, None
+
+
+# Returns URL of the file in the source repository authorized for reading.
+# S3 objects are accessed using presigned URLs and blobs are accessed using user delegation SAS.
+def source_url(source, blob_name: str):
+    expiry = datetime.now(timezone.utc) + timedelta(seconds=REPLICATION_URL_EXPIRATION)
+
+    if not isinstance(source, ContainerClient):
+        return source.meta.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': source.name, 'Key': blob_name},
+            ExpiresIn=REPLICATION_URL_EXPIRATION)
+
+    # Allow for clock skew between the machine and the storage service
+    start = datetime.now(timezone.utc) - timedelta(minutes=5)
+
+    service_client = BlobServiceClient(
+        account_url="{0}://{1}".format(source.scheme, source.primary_hostname),
+        credential=source.credential)
+
+    user_delegation_key = service_client.get_user_delegation_key(start, expiry)
+
+    sas = generate_blob_sas(
+        account_name=source.account_name,
+        container_name=source.container_name,
+        blob_name=blob_name,
+        user_delegation_key=user_delegation_key,
+        permission=BlobSasPermissions(read=True),
+        start=start,
+        expiry=expiry)
+
+    return source.get_blob_client(blob_name).url + '?' + sas
+
+
+# Copies the blob from the URL using asynchronous server-side copy and waits for the copy to complete.
+def copy_blob_from_url(blob_client, url: str, sha256: str):
+    blob_client.start_copy_from_url(url, metadata={'sha256': sha256})
+
+    properties = blob_client.get_blob_properties()
+
+    while properties.copy.status == 'pending':
+        time.sleep(COPY_STATUS_POLL_INTERVAL)
+        properties = blob_client.get_blob_properties()
+
+    if properties.copy.status != 'success':
+        raise Exception("Copy of blob '{0}' failed: {1}".format(blob_client.blob_name, properties.copy.status_description))
+
+
+# Copies the blob from the URL by staging blocks from the URL ranges in parallel.
+# The blocks are copied by the storage service, so the data does not pass through the machine.
+def stage_blob_from_url(blob_client, url: str, size: int, sha256: str, block_size: int, concurrency: int):
+    block_size = min(block_size, MAX_URL_BLOCK_SIZE)
+    blocks = [(offset, min(block_size, size - offset)) for offset in range(0, size, block_size)]
+    block_ids = [base64.b64encode('{0:08d}'.format(i).encode('utf-8')).decode('utf-8') for i in range(len(blocks))]
+
+    def stage_block(i):
+        offset, length = blocks[i]
+        blob_client.stage_block_from_url(block_ids[i], url, source_offset=offset, source_length=length)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(stage_block, range(len(blocks))))
+
+    blob_client.commit_block_list(block_ids, metadata={'sha256': sha256})
+
+
+# Copies the file from the source repository to the container using server-side copy.
+# The file is copied only if the source object has SHA-256 hash metadata that matches the expected hash.
+# Returns True if the file was replicated or already exists, or False if the file must be copied from the original location.
+def replicate_file(source, filename: str, subfolder: str, container_client, sha256=None, index=None, tuner=None):
+    blob_name = blob_name_of(filename, subfolder)
+    tuner = tuner if tuner else TransferTuner()
+
+    if sha256 and azure_blob_exists(container_client, blob_name, sha256, None, index):
+        print("Object '{0}' already exists in the Azure Blob Storage.".format(blob_name))
+        return True
+
+    source_sha256, size = source_metadata(source, blob_name)
+
+    if source_sha256 is None:
+        print("Object '{0}' with SHA-256 metadata is not found in the source repository.".format(blob_name))
+        return False
+
+    if sha256 and source_sha256 != sha256:
+        print("SHA-256 hash of '{0}' in the source repository does not match the expected hash.".format(blob_name))
+        return False
+
+    if not sha256 and azure_blob_exists(container_client, blob_name, source_sha256, None, index):
+        print("Object '{0}' already exists in the Azure Blob Storage.".format(blob_name))
+        return True
+
+    url = source_url(source, blob_name)
+
+    print("Copying '{0}' from '{1}' to '{2}'...".format(filename, url.split('?')[0], blob_name))
+
+    blob_client = container_client.get_blob_client(blob_name)
+
+    if isinstance(source, ContainerClient):
+        start = time.perf_counter()
+        copy_blob_from_url(blob_client, url, source_sha256)
+        print("'{0}' copied in {1:.1f} seconds".format(filename, time.perf_counter() - start))
     else:
-        blob_name = "{0}/{1}".format(subfolder, filename)
+        tuner.upload(filename, size,
+                     lambda block_size, concurrency: stage_blob_from_url(
+                         blob_client, url, size, source_sha256, block_size, concurrency),
+                     'copied')
+
+    if index is not None:
+        index.update(blob_name, source_sha256, size, url)
+
+    print("File '{0}' replicated.".format(filename))
+
+    return True
+
+
+def copy_file(url: str, path: str, filename: str, subfolder: str, container_client, sha256=None, index=None, tuner=None):
+    blob_name = blob_name_of(filename, subfolder)
+    tuner = tuner if tuner else TransferTuner()
 
     filepath = os.path.join(tempfile.gettempdir(), filename)
     
     try:
-        if sha256 and sha256 == azure_blob_sha256(container_client, blob_name):
+        if sha256 and azure_blob_exists(container_client, blob_name, sha256, url, index):
             print("Object '{0}' already exists in the Azure Blob Storage.".format(blob_name))
             return
 
+        hasher = None
+
         if path:
             filepath = path
         else:
             print("Downloading '{0}' from '{1}'...".format(filename, url))
-            urllib.request.urlretrieve(url, filepath)
+            hasher = hash_utils.download_url(url, filepath)
 
         extra_args = {}
 
         if sha256:
             print("Validating SHA256 hash...")
-            
-            with open(filepath, 'rb') as f:
-                sha256_hash = hashlib.sha256()
-                sha256_hash.update(f.read())
-                print("SHA-256=" + sha256_hash.hexdigest())
-                if sha256_hash.hexdigest().lower() != sha256:
-                    raise Exception(
-                        "SHA-256 hash validation of '{0}' failed.".format(filename))
+
+            if hasher is None:
+                hasher = hash_utils.file_sha256(filepath)
+
+            print(hasher.report(filename))
+            hasher.validate(filename, sha256)
             
             extra_args = {'sha256': sha256}
         
         print("Uploading '{0}' to '{1}'...".format(filename, blob_name))
 
-        with open(filepath, 'rb') as data:
-            blob_client = container_client.get_blob_client(blob_name)
-            
-            blob_client.upload_blob(data, overwrite=True, max_concurrency=MAX_CONCURRENCY)
+        def upload(block_size, concurrency):
+            with open(filepath, 'rb') as data:
+                tuned_blob_client(container_client, blob_name, block_size).upload_blob(
+                    data, overwrite=True, max_concurrency=concurrency)
+
+        tuner.upload(filename, os.path.getsize(filepath), upload)
+
+        blob_client = container_client.get_blob_client(blob_name)
 
-            properties = blob_client.get_blob_properties()
-            blob_metadata = properties.metadata
-            blob_metadata.update(extra_args)
-            blob_client.set_blob_metadata(metadata=blob_metadata)
+        properties = blob_client.get_blob_properties()
+        blob_metadata = properties.metadata
+        blob_metadata.update(extra_args)
+        blob_client.set_blob_metadata(metadata=blob_metadata)
+
+        if sha256 and index is not None:
+            index.update(blob_name, sha256, os.path.getsize(filepath), url or path)
 
         print("File '{0}' copied.".format(filename))
     finally:
@@ -93,7 +283,7 @@ def copy_file(url: str, path: str, filename: str, subfolder: str, container_clie
             os.remove(filepath)
 
 
-def copy_files(data, container_client, username, password):
+def copy_files(data, container_client, username, password, index=None, tuner=None, source=None):
     if 'server' in data['arcgis']['repository'] and \
        'url' in data['arcgis']['repository']['server']:
         downloads_api = DownloadsAPIClient(
@@ -110,25 +300,62 @@ def copy_files(data, container_client, username, password):
 
     files = data['arcgis']['repository']['files']
 
+    planned_files = []
+
     for filename, props in files.items():
         subfolder = props['subfolder'] if 'subfolder' in props else None
         sha256 = props['sha256'].lower() if 'sha256' in props else None
         path = props['path'] if 'path' in props else None
         url = props['url'] if 'url' in props else None
 
-        if not path and not url:
-            # Generate Downloads API URL
-            token = token_service.generate_token(username, password)
-            url = downloads_api.generate_url(filename, subfolder, token)
+        if index is not None and index.is_current(blob_name_of(filename, subfolder), sha256):
+            print("Object '{0}' is up to date in the repository index.".format(filename))
+            continue
+
+        planned_files.append((filename, subfolder, sha256, path, url))
+
+    # Generate Downloads API URLs for the files copied from My Esri repository concurrently
+    my_esri_files = [(filename, subfolder) for filename, subfolder, sha256, path, url in planned_files
+                     if not path and not url]
+
+    my_esri_urls = {}
 
+    # In the replication mode the URLs are generated only for the files not found in the source repository
+    if my_esri_files and source is None:
         try:
-            copy_file(url, path, filename, subfolder, container_client, sha256)
+            token = token_service.get_token(username, password)
+            my_esri_urls = downloads_api.generate_urls(my_esri_files, token)
+        except Exception as e:
+            print("Failed to generate Downloads API URLs: {0}".format(e))
+
+    for filename, subfolder, sha256, path, url in planned_files:
+        my_esri_file = not path and not url
+
+        if my_esri_file:
+            url = my_esri_urls.get((filename, subfolder))
+
+        try:
+            if source is not None and not path and \
+               replicate_file(source, filename, subfolder, container_client, sha256, index, tuner):
+                continue
+
+            if my_esri_file and not url:
+                # Generate Downloads API URL
+                token = token_service.get_token(username, password)
+                url = downloads_api.generate_url(filename, subfolder, token)
+
+            copy_file(url, path, filename, subfolder, container_client, sha256, index, tuner)
         except Exception as e1:
             print(e1)
             print("Retrying copy of '{0}'...".format(filename))
 
             try:
-                copy_file(url, path, filename, subfolder, container_client, sha256)
+                if my_esri_file:
+                    # Generate a new Downloads API URL
+                    token = token_service.get_token(username, password)
+                    url = downloads_api.generate_url(filename, subfolder, token)
+
+                copy_file(url, path, filename, subfolder, container_client, sha256, index, tuner)
             except Exception as e2:
                 print(e2)
                 sys.exit(1)
@@ -142,7 +369,7 @@ def matches_pattern(filename, patterns):
     return False
 
 # 
-def copy_patches(data, container_client):
+def copy_patches(data, container_client, index=None, tuner=None, source=None):
     if 'patch_notification' not in data['arcgis']['repository']:
         return
     
@@ -156,8 +383,22 @@ def copy_patches(data, container_client):
     else:
         patches_repository = PatchNotification()
 
+    # Request only the patches released since the last successful sync
+    watermark = None
+    since = None
+
+    if index is not None:
+        watermark = watermark_property(patch_notification)
+        since = watermark_since(index.get_property(watermark))
+
+    sync_date = datetime.now(timezone.utc).date()
+
     patches = patches_repository.get_patches(patch_notification['products'], 
-                                             patch_notification['versions'])
+                                             patch_notification['versions'],
+                                             since)
+
+    if since:
+        print("{0} patches released since {1}.".format(len(patches), since.isoformat()))
 
     patches_processed = 0
 
@@ -176,13 +417,18 @@ def copy_patches(data, container_client):
                 continue
 
             sha256 = patch_sha[filename].lower() if filename in patch_sha else None
-           
-            copy_file(url, None, filename, subfolder, container_client, sha256)
+
+            if index is None or not index.is_current(blob_name_of(filename, subfolder), sha256):
+                if source is None or not replicate_file(source, filename, subfolder, container_client, sha256, index, tuner):
+                    copy_file(url, None, filename, subfolder, container_client, sha256, index, tuner)
 
             patches_processed += 1
 
     print("{0} patches copied.".format(patches_processed))
 
+    if watermark:
+        index.set_property(watermark, sync_date.isoformat())
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -199,6 +445,14 @@ if __name__ == '__main__':
                         help='My Esri user password')
     parser.add_argument('-f', dest='files', required=True,
                         help='Index JSON file path')
+    parser.add_argument('-i', dest='rebuild_index', required=False, action='store_true',
+                        help='Rebuild the repository index by checking metadata of each blob')
+    parser.add_argument('-m', dest='block_size', required=False, type=megabytes,
+                        help='Block size in MB (selected based on the file size by default)')
+    parser.add_argument('-t', dest='max_concurrency', required=False, type=int,
+                        help='Maximum number of threads used to upload a single file')
+    parser.add_argument('-o', dest='source', required=False,
+                        help='Source repository Azure Blob Storage container URL or S3 bucket name to replicate files from')
 
     args = parser.parse_args()
 
@@ -234,6 +488,24 @@ if __name__ == '__main__':
 
     print("Copying files to '{0}' Azure Blob Storage container...".format(args.container_name))
 
-    copy_files(data, container_client, username, password)
+    index = RepositoryIndex(container_client)
+
+    # The tuner is shared by all the transfers to estimate the upload throughput
+    tuner = TransferTuner(args.block_size, args.max_concurrency)
+
+    source = source_repository(args.source) if args.source else None
+
+    if source is not None:
+        print("Replicating files from '{0}' repository...".format(args.source))
 
-    copy_patches(data, container_client)
+    if args.rebuild_index:
+        index.reset()
+    else:
+        index.load()
+
+    try:
+        copy_files(data, container_client, username, password, index, tuner, source)
+
+        copy_patches(data, container_client, index, tuner, source)
+    finally:
+        index.save()
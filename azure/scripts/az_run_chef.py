@@ -15,11 +15,20 @@
 # The script uses Azure Run Command to run Chef Client in solo mode on VMs in specified roles.
 # It retrieves the Chef JSON attributes from the JSON_ATTRIBUTES environment variable
 # and puts them into a key vault secret specified by json_attributes_secret command line argument.
+#
+# The hash of the JSON attributes and the cookbooks version of the last successful Chef run is recorded
+# in ArcGISChefRunHash-<json attributes secret> tag of each VM. If -u argument is specified, Chef run is
+# skipped on the VMs where the last successful Chef run used the same attributes and cookbooks.
+# By default, Chef runs on all the target VMs.
+# The cookbooks version defaults to the value of 'cookbooks-url' Key Vault secret. If the cookbooks archive
+# is a blob, ETag of the blob is included in the version. For other URLs, only the URL is included,
+# so republishing the archive at the same URL is not detected.
 
 import argparse
 import base64
 import os
 import az_utils
+from azure.core.exceptions import ResourceNotFoundError
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 from azure.mgmt.compute.models import RunCommandInputParameter
@@ -81,6 +90,8 @@ if __name__ == "__main__":
     parser.add_argument('-e', dest='execution_timeout', type=int, default=3600, help='Execution timeout (seconds)')
     parser.add_argument("-v", dest="vault_name", help="Azure Key Vault name")
     parser.add_argument("-l", dest="log_level", default="info", help="Log level")
+    parser.add_argument("-k", dest="cookbooks_version", default=None, help="Chef cookbooks version or URL")
+    parser.add_argument("-u", dest="skip_converged", action="store_true", help="Skip Chef run on the VMs converged with the same attributes and cookbooks")
 
     args = parser.parse_args()
 
@@ -96,6 +107,16 @@ if __name__ == "__main__":
     vault_client = SecretClient(vault_url=vault_url, credential=credential)
     vault_client.set_secret(args.json_attributes_secret, jsonAttributes)
 
+    cookbooks_version = args.cookbooks_version
+
+    if cookbooks_version is None:
+        try:
+            cookbooks_version = vault_client.get_secret("cookbooks-url").value
+        except ResourceNotFoundError:
+            cookbooks_version = ""
+
+    cookbooks_version = az_utils.cookbooks_version(credential, cookbooks_version)
+
     parameters = [
         RunCommandInputParameter(name="VaultName", value=args.vault_name),
         RunCommandInputParameter(name="JsonAttributesSecret", value=args.json_attributes_secret),
@@ -112,7 +133,10 @@ if __name__ == "__main__":
         linux_script,
         parameters,
         args.vault_name,
-        int(args.execution_timeout)
+        int(args.execution_timeout),
+        az_utils.chef_run_hash_tag(args.json_attributes_secret),
+        az_utils.chef_run_hash(jsonAttributes, cookbooks_version),
+        args.skip_converged
     )
 
     vault_client.begin_delete_secret(args.json_attributes_secret).wait()
@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import json
 import os
 import sys
+import tempfile
 import time
 from datetime import datetime, timezone
 from azure.identity import DefaultAzureCredential
@@ -22,14 +25,228 @@ from azure.mgmt.compute.models import VirtualMachineRunCommand
 from azure.mgmt.compute.models import VirtualMachineRunCommandScriptSource
 from azure.mgmt.compute.models import RunCommandInputParameter
 from azure.mgmt.compute.models import RunCommandManagedIdentity
+from azure.mgmt.compute.models import VirtualMachineUpdate
 from azure.keyvault.secrets import SecretClient
 from azure.storage.blob import BlobClient
+from azure.core.exceptions import HttpResponseError
 from azure.core.exceptions import ResourceExistsError
+from azure.core.exceptions import ResourceNotFoundError
+
+try:
+    from azure.mgmt.resourcegraph import ResourceGraphClient
+    from azure.mgmt.resourcegraph.models import QueryRequest
+    from azure.mgmt.resourcegraph.models import QueryRequestOptions
+except ImportError:
+    ResourceGraphClient = None
 
 SLEEP_TIME = 10
 
+VM_QUERY = """Resources
+| where type =~ 'microsoft.compute/virtualmachines'
+| where tags['ArcGISEnterpriseID'] == '{0}' and tags['ArcGISDeploymentID'] == '{1}'
+| project id"""
+
+# Prefix of VM tags with the hash of the last successful Chef run attributes and cookbooks version
+CHEF_RUN_HASH_TAG = "ArcGISChefRunHash"
+
+
+# Returns SHA-256 hash of the Chef JSON attributes and the cookbooks version.
+# The attributes are normalized, so formatting and keys order changes do not change the hash.
+def chef_run_hash(json_attributes: str, cookbooks_version: str):
+    try:
+        json_attributes = json.dumps(json.loads(json_attributes), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        pass
+
+    sha256 = hashlib.sha256()
+    sha256.update(json_attributes.encode("utf-8"))
+    sha256.update(b"\n")
+    sha256.update((cookbooks_version or "").encode("utf-8"))
+
+    return sha256.hexdigest()
+
+
+# Returns the name of the VM tag with the Chef run hash of the specified Chef configuration,
+# such as the JSON attributes secret name, so that different configurations applied
+# to the same VMs do not overwrite each other's hashes.
+def chef_run_hash_tag(config: str):
+    return f"{CHEF_RUN_HASH_TAG}-{config}"
+
+
+# Returns the cookbooks version that includes ETag of the cookbooks archive if the archive is a blob,
+# so that republishing the archive at the same URL changes the version.
+# The ETag is not available for other URLs, and the version is the URL itself in that case.
+def cookbooks_version(credential, cookbooks_url: str):
+    if ".blob.core.windows.net/" not in cookbooks_url:
+        return cookbooks_url
+
+    try:
+        blob = BlobClient.from_blob_url(cookbooks_url, credential=credential)
+        return f"{cookbooks_url}#{blob.get_blob_properties().etag}"
+    except HttpResponseError as e:
+        print(f"Failed to retrieve ETag of {cookbooks_url}: {e}")
+        return cookbooks_url
+
+
+# Sets the VM tag value, or removes the tag if the value is None.
+def update_vm_tag(compute_client: ComputeManagementClient, vm, tag: str, value: str):
+    tags = dict(vm.tags or {})
+
+    if value is None:
+        if tags.pop(tag, None) is None:
+            return
+    else:
+        tags[tag] = value
+
+    compute_client.virtual_machines.begin_update(
+        resource_group_name=vm.id.split("/")[4],
+        vm_name=vm.name,
+        parameters=VirtualMachineUpdate(tags=tags)
+    ).result()
+
+    vm.tags = tags
+
+# Returns the name of the deployment's resource group.
+def deployment_resource_group(enterprise_id: str, deployment_id: str):
+    return f"{enterprise_id}-{deployment_id}-rg"
+
+
+def is_deployment_vm(tags: dict, enterprise_id: str, deployment_id: str):
+    return bool(tags) and tags.get("ArcGISEnterpriseID") == enterprise_id and \
+        tags.get("ArcGISDeploymentID") == deployment_id
+
+
+# Returns path of the file that caches the deployment VM IDs for the duration of a GitHub Actions workflow
+# run attempt, or None if the script does not run in a workflow.
+def vm_cache_path(subscription_id: str, enterprise_id: str, deployment_id: str):
+    run_id = os.environ.get("GITHUB_RUN_ID")
+
+    if not run_id:
+        return None
+
+    run_attempt = os.environ.get("GITHUB_RUN_ATTEMPT", "1")
+
+    return os.path.join(tempfile.gettempdir(),
+                        f"arcgis-vms-{run_id}-{run_attempt}-{subscription_id}-{enterprise_id}-{deployment_id}.json")
+
+
+# Returns the deployment VMs in the deployment's resource group, or empty list if the resource group does not exist.
+def list_resource_group_vms(compute_client: ComputeManagementClient, enterprise_id: str, deployment_id: str):
+    resource_group = deployment_resource_group(enterprise_id, deployment_id)
+
+    try:
+        return [vm for vm in compute_client.virtual_machines.list(resource_group_name=resource_group)
+                if is_deployment_vm(vm.tags, enterprise_id, deployment_id)]
+    except ResourceNotFoundError:
+        return []
+
+
+# Returns set of the deployment VM resource IDs queried by tags using Azure Resource Graph.
+def query_deployment_vm_ids(credential, subscription_id: str, enterprise_id: str, deployment_id: str):
+    graph_client = ResourceGraphClient(credential)
+    query = VM_QUERY.format(enterprise_id, deployment_id)
+    vm_ids = set()
+    skip_token = None
+
+    while True:
+        response = graph_client.resources(QueryRequest(
+            subscriptions=[subscription_id],
+            query=query,
+            options=QueryRequestOptions(skip_token=skip_token)
+        ))
+
+        for row in response.data:
+            vm_ids.add(row["id"])
+
+        skip_token = response.skip_token
+
+        if not skip_token:
+            break
+
+    return vm_ids
+
+
+# Retrieves the VMs by their resource IDs. Raises ResourceNotFoundError if a VM does not exist.
+def get_vms(compute_client: ComputeManagementClient, vm_ids):
+    return [compute_client.virtual_machines.get(resource_group_name=vm_id.split("/")[4],
+                                                vm_name=vm_id.split("/")[-1])
+            for vm_id in sorted(vm_ids)]
+
+
+# Returns the deployment VMs found by listing all the VMs in the subscription.
+# Within a GitHub Actions workflow run attempt, the VM IDs are cached in a temporary file, so that
+# the subsequent commands of the run attempt retrieve only the deployment VMs by their IDs.
+# If a cached VM does not exist anymore or no cached VMs are in the specified roles, the VMs are listed again.
+def list_subscription_vms(compute_client: ComputeManagementClient, subscription_id: str,
+                          enterprise_id: str, deployment_id: str, roles: list):
+    cache_path = vm_cache_path(subscription_id, enterprise_id, deployment_id)
+
+    if cache_path:
+        try:
+            with open(cache_path, "r") as f:
+                vms = get_vms(compute_client, json.load(f))
+
+            if any((vm.tags or {}).get("ArcGISRole") in roles for vm in vms):
+                return vms
+        except (OSError, ValueError):
+            pass
+        except ResourceNotFoundError:
+            print("Cached deployment VMs are outdated.")
+
+    print(f"Listing all VMs in the subscription to find '{deployment_id}' deployment's VMs...")
+
+    vms = [vm for vm in compute_client.virtual_machines.list_all()
+           if is_deployment_vm(vm.tags, enterprise_id, deployment_id)]
+
+    if cache_path and vms:
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([vm.id for vm in vms], f)
+        os.replace(tmp_path, cache_path)
+
+    return vms
+
+
+# Returns the deployment VMs in the specified machine roles.
+# The VMs are listed in the deployment's resource group on each call, so the membership and tags are current.
+# If the resource group does not exist or does not contain VMs in the specified roles, the VMs are queried
+# by tags using Azure Resource Graph if azure-mgmt-resourcegraph package is installed, and retrieved by
+# their resource IDs. If Resource Graph returns fewer VMs than the resource group listing, for example
+# because recently created VMs are not indexed yet, or the package is not installed, all the VMs in the
+# subscription are listed.
+def find_deployment_vms(credential, compute_client: ComputeManagementClient, subscription_id: str,
+                        enterprise_id: str, deployment_id: str, roles: list):
+    rg_vms = list_resource_group_vms(compute_client, enterprise_id, deployment_id)
+    result = [vm for vm in rg_vms if vm.tags.get("ArcGISRole") in roles]
+
+    if result:
+        return result
+
+    vms = None
+
+    if ResourceGraphClient is not None:
+        vm_ids = query_deployment_vm_ids(credential, subscription_id, enterprise_id, deployment_id)
+
+        # ARM resource IDs are case-insensitive, and the resource group name casing may differ
+        # between Resource Graph and Compute API.
+        if vm_ids and {vm_id.lower() for vm_id in vm_ids}.issuperset(vm.id.lower() for vm in rg_vms):
+            try:
+                vms = get_vms(compute_client, vm_ids)
+            except ResourceNotFoundError:
+                vms = None
+
+    if vms is None:
+        vms = list_subscription_vms(compute_client, subscription_id, enterprise_id, deployment_id, roles)
+
+    return [vm for vm in vms
+            if is_deployment_vm(vm.tags, enterprise_id, deployment_id) and vm.tags.get("ArcGISRole") in roles]
+
+
 # Runs a PowerShell script on VMs of the specified enterprise ID, deployment ID, and machine roles
 # using Azure Managed Run Command. Waits for the script to complete on all targeted VMs.
+# If hash_tag and run_hash are specified, the tag is set to run_hash on the VMs where the command succeeds,
+# and removed from the VMs where the command fails. If skip_converged is True, the VMs where the hash_tag
+# tag value equals run_hash are skipped.
 # Returns True if the command succeeded on all the VMs, False otherwise.
 def run_command(
     enterprise_id: str, # ArcGIS Enterprise ID
@@ -40,7 +257,10 @@ def run_command(
     linux_script: str,        # Shell script to execute
     parameters: list[RunCommandInputParameter], # Script parameters
     vault_name: str,    # Azure Key Vault name
-    timeout: int        # Execution timeout in seconds
+    timeout: int,       # Execution timeout in seconds
+    hash_tag: str = None,   # VM tag with the run hash of the last successful command
+    run_hash: str = None,   # Hash of the command inputs
+    skip_converged: bool = False    # Skip the command on the VMs with the same run hash
 ): 
     if not enterprise_id:
         print("ArcGIS Enterprise ID parameter is required.")
@@ -89,26 +309,30 @@ def run_command(
             if isinstance(param.value, str) and param.value.startswith("secret:"):
                 param.value = vault_client.get_secret(param.value[7:]).value
 
-    # Find all VMs with the specified tags
-    vms = compute_client.virtual_machines.list_all()
+    roles = [role.strip() for role in machine_roles.split(",")]
 
-    filtered_vms = []
+    # Find the deployment VMs in the specified roles
+    filtered_vms = find_deployment_vms(credential, compute_client, subscription_id,
+                                       enterprise_id, deployment_id, roles)
 
-    roles = [role.strip() for role in machine_roles.split(",")]
-    
-    for vm in vms:
-        if (
-            vm.tags
-            and vm.tags.get("ArcGISEnterpriseID") == enterprise_id
-            and vm.tags.get("ArcGISDeploymentID") == deployment_id
-            and vm.tags.get("ArcGISRole") in roles
-        ):
-            print(f"Found '{deployment_id}' deployment's '{vm.name}' VM in '{vm.provisioning_state}' state.")
-            filtered_vms.append(vm)
+    for vm in filtered_vms:
+        print(f"Found '{deployment_id}' deployment's '{vm.name}' VM in '{vm.provisioning_state}' state.")
 
     if not filtered_vms:
         print("No VMs found.")
         return False
+
+    if hash_tag and run_hash and skip_converged:
+        converged_vms = [vm for vm in filtered_vms if vm.tags.get(hash_tag) == run_hash]
+
+        for vm in converged_vms:
+            print(f"Skipping command '{command_name}' on '{vm.name}' VM converged with the same inputs.")
+
+        filtered_vms = [vm for vm in filtered_vms if vm not in converged_vms]
+
+        if not filtered_vms:
+            print("All the VMs are converged.")
+            return True
     
     # Wait up to 10 minutes for VMs to be in 'Succeeded' provisioning state
     for vm in filtered_vms:
@@ -217,6 +441,9 @@ def run_command(
                     if instance_view.exit_code != 0:
                         ret = False
 
+                    if hash_tag and run_hash:
+                        update_vm_tag(compute_client, vm, hash_tag, run_hash if instance_view.exit_code == 0 else None)
+
                     print(f"Command '{command_name}' on '{vm.name}' VM completed with status '{instance_view.execution_state}' ({instance_view.exit_code}) in {elapsed_time:.1f} seconds.")
 
                     if status.output_blob_uri:
@@ -243,6 +470,9 @@ def run_command(
         except Exception as e:
             print(f"Command '{command_name}' on '{vm.name}' VM failed: {e}", file=sys.stderr)
             ret = False
+
+            if hash_tag and run_hash:
+                update_vm_tag(compute_client, vm, hash_tag, None)
         finally:
             compute_client.virtual_machine_run_commands.begin_delete(
                 resource_group_name=resource_group,
@@ -0,0 +1,161 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Resumable HTTP downloads using parallel Range requests.
+#
+# Large files are split into fixed-size segments downloaded in parallel into <file>.part file.
+# Completed segments are recorded in <file>.download.json state file, so a retry of a failed
+# download fetches only the missing segments. If the server does not support Range requests,
+# the file is downloaded in a single stream.
+
+import json
+import os
+import re
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import hash_utils
+
+DEFAULT_CONNECTIONS = 4
+SEGMENT_SIZE = 64 * 1024 * 1024
+# Files smaller than this size are downloaded in a single stream.
+MIN_RANGED_SIZE = 2 * SEGMENT_SIZE
+CHUNK_SIZE = 1024 * 1024
+
+
+# Probes the URL with a single byte Range request.
+# Returns (size, supports_ranges, validator) tuple, where validator is the ETag or Last-Modified header value
+# used to check that the file did not change between the download attempts.
+# Signed download URLs often do not allow HEAD requests, so GET request is used.
+def probe_url(url: str):
+    request = urllib.request.Request(url, headers={'Range': 'bytes=0-0'})
+
+    with urllib.request.urlopen(request) as response:
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        content_range = response.headers.get('Content-Range')
+
+        if response.status == 206 and content_range:
+            match = re.match(r'bytes\s+\d+-\d+/(\d+)', content_range)
+            if match:
+                return int(match.group(1)), True, validator
+
+        content_length = response.headers.get('Content-Length')
+
+        return int(content_length) if content_length else None, False, validator
+
+
+def load_state(state_path: str, part_path: str, size: int, validator: str, segment_size: int):
+    if not os.path.exists(state_path) or not os.path.exists(part_path):
+        return None
+
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except Exception:
+        return None
+
+    if state.get('size') != size or state.get('validator') != validator or \
+       state.get('segment_size') != segment_size or os.path.getsize(part_path) != size:
+        return None
+
+    return state
+
+
+def save_state(state_path: str, state: dict):
+    tmp_path = state_path + '.tmp'
+
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+
+    os.replace(tmp_path, state_path)
+
+
+# Downloads bytes start..end (inclusive) of the file into the part file at the same offset.
+def download_segment(url: str, part_path: str, start: int, end: int):
+    request = urllib.request.Request(url, headers={'Range': 'bytes={0}-{1}'.format(start, end)})
+
+    with urllib.request.urlopen(request) as response, open(part_path, 'r+b') as f:
+        if response.status != 206:
+            raise Exception("Server returned status {0} for Range request.".format(response.status))
+
+        f.seek(start)
+        received = 0
+
+        for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+            f.write(chunk)
+            received += len(chunk)
+
+    if received != end - start + 1:
+        raise Exception("Segment {0}-{1} is incomplete: {2} bytes received.".format(start, end, received))
+
+
+# Downloads the file from the URL to filepath and returns Sha256Hasher with the file's hash.
+# connections: number of segments downloaded in parallel
+def download(url: str, filepath: str, connections=DEFAULT_CONNECTIONS, segment_size=SEGMENT_SIZE):
+    size, supports_ranges, validator = probe_url(url)
+
+    if not supports_ranges or size is None or size < MIN_RANGED_SIZE or connections < 2:
+        return hash_utils.download_url(url, filepath)
+
+    part_path = filepath + '.part'
+    state_path = filepath + '.download.json'
+
+    state = load_state(state_path, part_path, size, validator, segment_size)
+
+    if state:
+        print("Resuming download of '{0}' ({1} of {2} segments completed)...".format(
+              os.path.basename(filepath), len(state['completed']), (size + segment_size - 1) // segment_size))
+    else:
+        state = {
+            'size': size,
+            'validator': validator,
+            'segment_size': segment_size,
+            'completed': []
+        }
+
+        with open(part_path, 'wb') as f:
+            f.truncate(size)
+
+        save_state(state_path, state)
+
+    completed = set(state['completed'])
+    lock = threading.Lock()
+
+    def download_and_record(segment: int):
+        start = segment * segment_size
+        end = min(start + segment_size, size) - 1
+
+        download_segment(url, part_path, start, end)
+
+        with lock:
+            state['completed'].append(segment)
+            save_state(state_path, state)
+
+    segments = [s for s in range((size + segment_size - 1) // segment_size) if s not in completed]
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(download_and_record, segment) for segment in segments]
+
+        # Wait for all the segments, so the completed ones are recorded before the error is raised.
+        errors = [future.exception() for future in futures]
+
+    for error in errors:
+        if error:
+            raise error
+
+    os.replace(part_path, filepath)
+    os.remove(state_path)
+
+    return hash_utils.file_sha256(filepath)
@@ -1,4 +1,4 @@
-# Copyright 2024 Esri
+# Copyright 2024-2026 Esri
 #
 # Licensed under the Apache License Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -18,17 +18,52 @@ import argparse
 import os
 import json
 import ssl
+import threading
+import time
 import urllib.parse
 import urllib.request
 
+# Cached tokens are refreshed if they expire in less than REFRESH_MARGIN seconds.
+REFRESH_MARGIN = 120
+
 
 class TokenServiceClient:
 
     def __init__(self, token_service_url='https://www.arcgis.com/sharing/rest/generateToken'):
         self.token_service_url = token_service_url
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    # Returns token for the specified username and password.
+    # The token is cached and reused until it is about to expire.
+    def get_token(self, username: str, password: str, referer='referer', expiration=600):
+        key = (username, referer)
+
+        with self._lock:
+            if key in self._tokens:
+                token, expires = self._tokens[key]
+                if expires - time.time() > REFRESH_MARGIN:
+                    return token
+
+            json_response = self._request_token(username, password, referer, expiration)
+
+            token = json_response['token']
+
+            # The token service returns the expiration time in milliseconds since epoch.
+            if 'expires' in json_response:
+                expires = json_response['expires'] / 1000
+            else:
+                expires = time.time() + expiration
+
+            self._tokens[key] = (token, expires)
+
+            return token
 
     # Generates token for the specified username and password.
     def generate_token(self, username: str, password: str, referer='referer', expiration=600):
+        return self._request_token(username, password, referer, expiration)['token']
+
+    def _request_token(self, username: str, password: str, referer: str, expiration: int):
         if username is None:
             raise ValueError('ArcGIS Online user name is not specified.')
 
@@ -58,7 +93,7 @@ class TokenServiceClient:
         if 'error' in json_response and 'message' in json_response['error']:
             raise Exception(json_response['error']['message'])
 
-        return json_response['token']
+        return json_response
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -0,0 +1,240 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Benchmarks repository transfer scripts and modules using local stand-ins of the file servers and storage services.
+#
+# Synthetic setup files are served by a local HTTP server, S3 is emulated by moto server or MinIO,
+# and Azure Blob Storage is emulated by Azurite. Each scenario is run in a separate process and
+# the results with throughput, peak RSS, API request counts, and wall clock time of each scenario
+# are written to a JSON file.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import stand_ins
+from scenarios import REPO_DIR, SCENARIOS
+
+SCENARIOS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios.py')
+
+S3_SCENARIOS = ['s3_copy_files', 's3_copy_files_stream', 's3files']
+
+AZURITE_CONNECTION_STRING = 'UseDevelopmentStorage=true'
+
+# Number of scenario log lines included in the result of a failed scenario.
+ERROR_LOG_LINES = 20
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except Exception:
+        return None
+
+
+# Returns environment variables of the scenario processes that point AWS SDK to the S3 stand-in.
+def scenario_env(s3_endpoint: str, moto: bool, work_dir: str):
+    env = dict(os.environ)
+
+    env['PYTHONUNBUFFERED'] = '1'
+    env['AWS_ENDPOINT_URL_S3'] = s3_endpoint
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    if moto:
+        env['AWS_ACCESS_KEY_ID'] = 'testing'
+        env['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        env.pop('AWS_SESSION_TOKEN', None)
+        env.pop('AWS_PROFILE', None)
+
+    # Local S3 endpoints do not support virtual-hosted-style requests
+    config_file = os.path.join(work_dir, 'aws-config')
+
+    with open(config_file, 'w') as f:
+        f.write('[default]\ns3 =\n    addressing_style = path\n')
+
+    env['AWS_CONFIG_FILE'] = config_file
+
+    return env
+
+
+# Runs the scenario in a separate process and returns the scenario result.
+def run_scenario(scenario: str, config: dict, env: dict, work_dir: str):
+    scenario_dir = tempfile.mkdtemp(prefix=scenario + '-', dir=work_dir)
+
+    config_file = os.path.join(scenario_dir, 'config.json')
+    result_file = os.path.join(scenario_dir, 'result.json')
+    log_file = os.path.join(scenario_dir, 'scenario.log')
+
+    with open(config_file, 'w') as f:
+        json.dump(dict(config, work_dir=scenario_dir), f)
+
+    with open(log_file, 'w') as log:
+        returncode = subprocess.call([sys.executable, SCENARIOS_SCRIPT, scenario, config_file, result_file],
+                                     stdout=log, stderr=subprocess.STDOUT, env=env)
+
+    total_bytes = sum(props['size'] for props in config['files'].values())
+
+    result = {
+        'scenario': scenario,
+        'files': len(config['files']),
+        'bytes': total_bytes
+    }
+
+    if returncode != 0 or not os.path.exists(result_file):
+        with open(log_file, 'r') as f:
+            result['status'] = 'failed'
+            result['error'] = ''.join(f.readlines()[-ERROR_LOG_LINES:])
+        return result
+
+    with open(result_file, 'r') as f:
+        scenario_result = json.load(f)
+
+    # Remove the downloaded files of the succeeded scenario. Directories of failed scenarios are kept for troubleshooting.
+    shutil.rmtree(scenario_dir, ignore_errors=True)
+
+    wall_clock = scenario_result['wall_clock_seconds']
+
+    result.update({
+        'status': 'succeeded',
+        'wall_clock_seconds': round(wall_clock, 3),
+        # The peak RSS is measured by the scenario process itself, excluding the memory of the benchmark
+        # process and the in-process S3 stand-in it was forked from.
+        'peak_rss_mb': round(scenario_result['peak_rss_bytes'] / (1024 * 1024), 1),
+        'throughput_mb_s': round(total_bytes / (1024 * 1024) / wall_clock, 1) if wall_clock > 0 else None,
+        'api_requests': scenario_result['api_requests'],
+        'api_requests_total': sum(scenario_result['api_requests'].values())
+    })
+
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='run_benchmarks.py',
+        description='Benchmarks repository transfer scripts and modules using local stand-ins of the file servers and storage services.')
+
+    parser.add_argument('-c', dest='scenarios', required=False,
+                        default=','.join(SCENARIOS.keys()),
+                        help='Comma-separated list of scenarios (default: all scenarios)')
+    parser.add_argument('-s', dest='sizes', required=False, default='1,64',
+                        help='Comma-separated list of synthetic setup sizes in MB (default: 1,64)')
+    parser.add_argument('-n', dest='count', required=False, type=int, default=2,
+                        help='Number of synthetic setups of each size (default: 2)')
+    parser.add_argument('-w', dest='workers', required=False, type=int, default=4,
+                        help='Number of files transferred concurrently by s3_copy_files, s3files, and azure_files (default: 4)')
+    parser.add_argument('-k', dest='connections', required=False, type=int, default=4,
+                        help='Number of parallel connections used by download_files (default: 4)')
+    parser.add_argument('-e', dest='s3_endpoint', required=False,
+                        help='S3 endpoint URL, such as MinIO server URL (moto server is started by default)')
+    parser.add_argument('-a', dest='azure_connection_string', required=False,
+                        default=AZURITE_CONNECTION_STRING,
+                        help='Azure Storage connection string (default: local Azurite)')
+    parser.add_argument('-d', dest='work_dir', required=False,
+                        help='Working directory for the synthetic setups and downloaded files')
+    parser.add_argument('-o', dest='output', required=False, default='benchmark-results.json',
+                        help='Output JSON file path (default: benchmark-results.json)')
+
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            print("Unknown scenario '{0}'.".format(scenario))
+            sys.exit(1)
+
+    work_dir = args.work_dir if args.work_dir else tempfile.mkdtemp(prefix='arcgis-gitops-benchmarks-')
+    files_dir = os.path.join(work_dir, 'files')
+
+    files = stand_ins.generate_files(files_dir, [int(s) for s in args.sizes.split(',')], args.count)
+
+    file_server = stand_ins.FileServer(files_dir)
+    file_server.start()
+
+    for filename, props in files.items():
+        props['url'] = file_server.url(filename)
+
+    moto_server = None
+    s3_endpoint = args.s3_endpoint
+
+    if not s3_endpoint and any(s in S3_SCENARIOS for s in scenarios):
+        try:
+            moto_server, s3_endpoint = stand_ins.start_moto_server()
+        except Exception as e:
+            print(e)
+            sys.exit(1)
+
+    env = scenario_env(s3_endpoint or '', moto_server is not None, work_dir)
+
+    config = {
+        'files': files,
+        'files_dir': files_dir,
+        'workers': args.workers,
+        'connections': args.connections,
+        'azure_connection_string': args.azure_connection_string
+    }
+
+    results = []
+
+    try:
+        for scenario in scenarios:
+            print("Running '{0}' scenario...".format(scenario))
+
+            file_server.reset()
+
+            result = run_scenario(scenario, config, env, work_dir)
+            result['http_requests'] = file_server.reset()
+
+            if result['status'] == 'succeeded':
+                print("'{0}': {1} MB/s, {2} s, {3} MB peak RSS, {4} API requests, {5} HTTP requests".format(
+                      scenario, result['throughput_mb_s'], result['wall_clock_seconds'], result['peak_rss_mb'],
+                      result['api_requests_total'], result['http_requests']))
+            else:
+                print("'{0}' scenario failed:\n{1}".format(scenario, result['error']))
+
+            results.append(result)
+    finally:
+        file_server.stop()
+
+        if moto_server is not None:
+            moto_server.stop()
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': {
+                'sizes_mb': [int(s) for s in args.sizes.split(',')],
+                'count': args.count,
+                'workers': args.workers,
+                'connections': args.connections,
+                's3': 'moto' if moto_server is not None else args.s3_endpoint
+            },
+            'results': results
+        }, f, indent=2)
+
+    print("Benchmark results saved to '{0}'.".format(args.output))
+
+    if any(result['status'] != 'succeeded' for result in results):
+        sys.exit(1)
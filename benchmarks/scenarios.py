@@ -0,0 +1,326 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Runs a single benchmark scenario.
+#
+# Each scenario is run by run_benchmarks.py in a separate process, so the peak RSS is measured
+# for the scenario only. The scenario prepares the destination, resets the request counters,
+# runs the measured code path, and writes the wall clock time, peak RSS, and API request counts to the result file.
+#
+# usage: python scenarios.py SCENARIO CONFIG_FILE RESULT_FILE
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AWS_SCRIPTS_DIR = os.path.join(REPO_DIR, 'aws', 'scripts')
+AZURE_SCRIPTS_DIR = os.path.join(REPO_DIR, 'azure', 'scripts')
+
+SOFTWARE_SUBFOLDER = 'software/benchmark'
+
+
+class RequestCounter:
+
+    def __init__(self):
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str):
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}
+
+
+# Counts S3 API calls by operation name.
+# The handler is registered on the default boto3 session before any clients are created,
+# so the clients created by the benchmarked code inherit it.
+def count_s3_requests(counter: RequestCounter):
+    import boto3
+
+    boto3.setup_default_session()
+    boto3.DEFAULT_SESSION.events.register(
+        'before-call.s3', lambda model, **kwargs: counter.add(model.name))
+
+
+# Counts Azure Storage requests by HTTP method and 'comp' query parameter.
+def count_azure_requests(counter: RequestCounter):
+    from azure.core.pipeline.transport import RequestsTransport
+
+    send = RequestsTransport.send
+
+    def counting_send(self, request, **kwargs):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(request.url).query)
+        name = request.method + (' ' + query['comp'][0] if 'comp' in query else '')
+        counter.add(name)
+        return send(self, request, **kwargs)
+
+    RequestsTransport.send = counting_send
+
+
+def unique_name(scenario: str):
+    return 'benchmark-{0}-{1}'.format(scenario.replace('_', '-'), uuid.uuid4().hex[:8])
+
+
+# Returns repository index JSON data with the URLs of the files served by the local HTTP server.
+def repository_data(config: dict):
+    return {
+        'arcgis': {
+            'repository': {
+                'files': {
+                    filename: {
+                        'url': props['url'],
+                        'sha256': props['sha256'],
+                        'subfolder': SOFTWARE_SUBFOLDER
+                    } for filename, props in config['files'].items()
+                }
+            }
+        }
+    }
+
+
+def create_bucket(scenario: str):
+    import boto3
+
+    bucket = boto3.resource('s3').Bucket(unique_name(scenario))
+    bucket.create()
+
+    return bucket
+
+
+def download_files_scenario(config: dict, counter: RequestCounter):
+    sys.path.insert(0, AWS_SCRIPTS_DIR)
+
+    import download_files
+
+    download_dir = tempfile.mkdtemp(dir=config['work_dir'])
+    data = repository_data(config)
+
+    def run():
+        download_files.download_files(data, download_dir, None, None, config['connections'])
+
+    return run
+
+
+def s3_copy_files_scenario(config: dict, counter: RequestCounter, stream=False):
+    sys.path.insert(0, AWS_SCRIPTS_DIR)
+
+    count_s3_requests(counter)
+
+    import s3_copy_files
+    from repository_index import RepositoryIndex
+    from transfer_tuning import TransferTuner
+
+    s3_bucket = create_bucket('s3_copy_files')
+    data = repository_data(config)
+
+    def run():
+        index = RepositoryIndex(s3_bucket)
+        index.load()
+
+        try:
+            summary = s3_copy_files.copy_files(data, s3_bucket, None, None,
+                                               config['workers'], 0, stream, index, TransferTuner())
+        finally:
+            index.save()
+
+        if not summary.succeeded():
+            raise Exception("{0} files failed to copy.".format(len(summary.failed)))
+
+    return run
+
+
+def s3_copy_files_stream_scenario(config: dict, counter: RequestCounter):
+    return s3_copy_files_scenario(config, counter, stream=True)
+
+
+def az_copy_files_scenario(config: dict, counter: RequestCounter):
+    sys.path.insert(0, AZURE_SCRIPTS_DIR)
+
+    count_azure_requests(counter)
+
+    from azure.storage.blob import BlobServiceClient
+    import az_copy_files
+    from repository_index import RepositoryIndex
+    from transfer_tuning import TransferTuner
+
+    service_client = BlobServiceClient.from_connection_string(config['azure_connection_string'])
+    container_client = service_client.create_container(unique_name('az_copy_files'))
+    data = repository_data(config)
+
+    def run():
+        index = RepositoryIndex(container_client)
+        index.load()
+
+        try:
+            az_copy_files.copy_files(data, container_client, None, None, index, TransferTuner())
+        finally:
+            index.save()
+
+    return run
+
+
+def s3files_scenario(config: dict, counter: RequestCounter):
+    sys.path.insert(0, REPO_DIR)
+
+    count_s3_requests(counter)
+
+    from ansible_collections.arcgis.common.plugins.modules import s3files
+
+    s3_bucket = create_bucket('s3files')
+
+    # Populate the bucket with the synthetic setups
+    for filename in config['files']:
+        s3_bucket.upload_file(os.path.join(config['files_dir'], filename),
+                              '{0}/{1}'.format(SOFTWARE_SUBFOLDER, filename))
+
+    local_dir = tempfile.mkdtemp(dir=config['work_dir'])
+    manifest_path = os.path.join(local_dir, 'manifest.json')
+
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            'arcgis': {
+                'repository': {
+                    'server': {
+                        's3bucket': s3_bucket.name,
+                        'region': os.environ.get('AWS_DEFAULT_REGION', 'us-east-1')
+                    },
+                    'local_archives': os.path.join(local_dir, 'archives'),
+                    'local_patches': os.path.join(local_dir, 'patches'),
+                    'patch_notification': {
+                        'subfolder': 'software/patches',
+                        'patches': []
+                    },
+                    'files': {
+                        filename: {
+                            'subfolder': SOFTWARE_SUBFOLDER,
+                            'sha256': props['sha256']
+                        } for filename, props in config['files'].items()
+                    }
+                }
+            }
+        }, f, indent=2)
+
+    def run():
+        s3files.download_s3_files(manifest_path, config['workers'])
+
+    return run
+
+
+def azure_files_scenario(config: dict, counter: RequestCounter):
+    sys.path.insert(0, REPO_DIR)
+
+    count_azure_requests(counter)
+
+    from azure.storage.blob import BlobServiceClient
+    from ansible_collections.arcgis.common.plugins.modules import azure_files
+
+    service_client = BlobServiceClient.from_connection_string(config['azure_connection_string'])
+    container_client = service_client.create_container(unique_name('azure_files'))
+
+    # Populate the container with the synthetic setups
+    for filename in config['files']:
+        with open(os.path.join(config['files_dir'], filename), 'rb') as f:
+            container_client.upload_blob('{0}/{1}'.format(SOFTWARE_SUBFOLDER, filename), f)
+
+    local_dir = tempfile.mkdtemp(dir=config['work_dir'])
+    manifest_path = os.path.join(local_dir, 'manifest.json')
+
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            'arcgis': {
+                'repository': {
+                    'server': {
+                        'endpoint': service_client.url,
+                        'account_name': service_client.account_name,
+                        'container_name': container_client.container_name,
+                        'auth_mode': 'key',
+                        'account_key': service_client.credential.account_key
+                    },
+                    'local_archives': os.path.join(local_dir, 'archives'),
+                    'local_patches': os.path.join(local_dir, 'patches'),
+                    'files': {
+                        filename: {
+                            'subfolder': SOFTWARE_SUBFOLDER,
+                            'sha256': props['sha256']
+                        } for filename, props in config['files'].items()
+                    }
+                }
+            }
+        }, f, indent=2)
+
+    def run():
+        azure_files.download_azure_files(manifest_path, config['workers'])
+
+    return run
+
+
+SCENARIOS = {
+    'download_files': download_files_scenario,
+    's3_copy_files': s3_copy_files_scenario,
+    's3_copy_files_stream': s3_copy_files_stream_scenario,
+    'az_copy_files': az_copy_files_scenario,
+    's3files': s3files_scenario,
+    'azure_files': azure_files_scenario
+}
+
+
+# Returns peak resident set size of the current process in bytes.
+# On Linux, VmHWM of the process is used, because ru_maxrss of a process started by fork and exec
+# includes the peak RSS of the parent process before exec.
+def peak_rss():
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    import resource
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+if __name__ == '__main__':
+    scenario, config_file, result_file = sys.argv[1:4]
+
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+
+    counter = RequestCounter()
+
+    run = SCENARIOS[scenario](config, counter)
+
+    counter.reset()
+
+    start = time.perf_counter()
+    run()
+    wall_clock = time.perf_counter() - start
+
+    with open(result_file, 'w') as f:
+        json.dump({
+            'wall_clock_seconds': wall_clock,
+            'peak_rss_bytes': peak_rss(),
+            'api_requests': counter.requests
+        }, f)
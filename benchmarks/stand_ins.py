@@ -0,0 +1,174 @@
+# Copyright 2026 Esri
+#
+# Licensed under the Apache License Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Local stand-ins of the file servers and storage services used by the repository transfer benchmarks.
+
+import hashlib
+import http.server
+import os
+import re
+import socket
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+
+# Returns a free TCP port on the loopback interface.
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Generates synthetic setup files with random content in the directory.
+# Existing files of the same size are reused.
+# sizes: list of file sizes in MB
+# count: number of files of each size
+# Returns dictionary of the generated files with their sizes and SHA-256 hashes.
+def generate_files(directory: str, sizes: list, count: int):
+    os.makedirs(directory, exist_ok=True)
+
+    files = {}
+
+    for size_mb in sizes:
+        size = size_mb * 1024 * 1024
+
+        for i in range(count):
+            filename = 'Setup_{0}MB_{1}.tar.gz'.format(size_mb, i + 1)
+            filepath = os.path.join(directory, filename)
+            sha256 = hashlib.sha256()
+
+            if os.path.exists(filepath) and os.path.getsize(filepath) == size:
+                with open(filepath, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        sha256.update(chunk)
+            else:
+                print("Generating '{0}'...".format(filename))
+
+                with open(filepath, 'wb') as f:
+                    remaining = size
+                    while remaining > 0:
+                        chunk = os.urandom(min(CHUNK_SIZE, remaining))
+                        sha256.update(chunk)
+                        f.write(chunk)
+                        remaining -= len(chunk)
+
+            files[filename] = {
+                'size': size,
+                'sha256': sha256.hexdigest()
+            }
+
+    return files
+
+
+class FileRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.count_request()
+
+        filepath = os.path.join(self.server.directory, os.path.basename(self.path.split('?')[0]))
+
+        if not os.path.isfile(filepath):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(filepath)
+        start = 0
+        end = size - 1
+
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+
+            if start >= size:
+                self.send_error(416)
+                return
+
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(start, end, size))
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"{0}-{1}"'.format(size, int(os.path.getmtime(filepath))))
+        self.end_headers()
+
+        with open(filepath, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# HTTP file server that supports Range requests and counts the requests.
+class FileServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, directory: str):
+        super().__init__(('127.0.0.1', 0), FileRequestHandler)
+        self.directory = directory
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    # Returns the number of requests since the last reset and resets the counter.
+    def reset(self):
+        with self._lock:
+            requests = self.requests
+            self.requests = 0
+            return requests
+
+    def url(self, filename: str):
+        return 'http://127.0.0.1:{0}/{1}'.format(self.server_address[1], filename)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# Starts moto S3 server on a free port and returns (server, endpoint_url) tuple.
+def start_moto_server():
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        raise Exception("moto[server] package is required to run S3 benchmarks without S3 endpoint.")
+
+    port = free_port()
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+
+    return server, 'http://127.0.0.1:{0}'.format(port)